@@ -1,10 +1,14 @@
+import numpy as np
 import pandas as pd
 from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 
-from matplotlib.bezier import BezierSegment
 import matplotlib.pyplot as plt
 import textwrap
+from math import comb
+
+from .graph import GraphIndex
+from .xfmv_parser import curve_points
 
 
 class Visualizer:
@@ -82,13 +86,14 @@ class Visualizer:
         node_outputFn = [False] * len(function_data)
 
         # Determines which nodes (ordered by the functions IDNr = index)
-        # have outputs and/or inputs.
+        # have outputs and/or inputs. Connections to unknown functions are
+        # skipped.
         for i in connection_data.toFn:
-            if i is not None:
+            if i is not None and 0 <= i < len(node_toFn):
                 node_toFn[i] = True
 
         for i in connection_data.outputFn:
-            if i is not None:
+            if i is not None and 0 <= i < len(node_outputFn):
                 node_outputFn[i] = True
 
         node_facecolors = []  # Array of face colors
@@ -202,32 +207,37 @@ class Visualizer:
                         fontsize=3.5)
 
     def _get_bezier_points(self,
-                           curve: str) -> tuple[list, list]:
-        """ Return a set (x, y) positions along each Bezier curve. """
+                           curves: np.ndarray) -> tuple[np.ndarray,
+                                                        np.ndarray]:
+        """
+        Return a set of (x, y) positions along each Bezier curve.
 
-        # Curve coordinates
-        a = curve.split("|")
+        Parameters
+        ----------
+        curves : np.ndarray
+            A (number of curves, 10) array of control points, in the order
+            of the xfmv Curve string.
 
-        # Must be in this order!
-        control_points = [(float(a[2]), float(a[3])),
-                          (float(a[4]), float(a[5])),
-                          (float(a[8]), float(a[9])),
-                          (float(a[6]), float(a[7])),
-                          (float(a[0]), float(a[1]))]
-        bezier_segment = BezierSegment(control_points)
+        Returns
+        -------
+        np.ndarray
+            A (number of curves, 101) array of x positions.
+        np.ndarray
+            A (number of curves, 101) array of y positions.
+        """
 
-        x_pts = []
-        y_pts = []
-        for j in range(0, 101):
-            x, y = bezier_segment.point_at_t(j / 100)
-            x_pts.append(x)
-            y_pts.append(y)
+        # Control points from p4 to p0. Must be in this order!
+        x_ctrl = curves[:, [2, 4, 8, 6, 0]]
+        y_ctrl = curves[:, [3, 5, 9, 7, 1]]
 
-        for j in range(len(x_pts)):
-            x_pts[j] = x_pts[j] - 48
+        # Bernstein basis of the quartic Bezier, shape (101, 5)
+        t = np.linspace(0, 1, 101)[:, np.newaxis]
+        i = np.arange(5)
+        binomial = np.array([comb(4, k) for k in range(5)])
+        basis = binomial * t**i * (1 - t)**(4 - i)
 
-        for j in range(len(y_pts)):
-            y_pts[j] = y_pts[j] - 50
+        x_pts = x_ctrl @ basis.T - 48
+        y_pts = y_ctrl @ basis.T - 50
 
         return x_pts, y_pts
 
@@ -261,11 +271,13 @@ class Visualizer:
         if appearance is None and real_connections is not None:
             appearance = 'pure'
 
-        for index, row in connection_data[['Name', 'Curve']].iterrows():
-            curve = row['Curve']
-            name = row['Name']
+        curves = curve_points(connection_data)
+        drawn = ~np.isnan(curves).any(axis=1)
 
-            x_pts, y_pts = self._get_bezier_points(curve)
+        all_x_pts, all_y_pts = self._get_bezier_points(curves)
+
+        for name, x_pts, y_pts in zip(connection_data['Name'][drawn],
+                                      all_x_pts[drawn], all_y_pts[drawn]):
 
             if real_connections is None:
                 ax.plot(x_pts, y_pts, zorder=1, color='#999999', lw=1)
@@ -396,7 +408,8 @@ class Visualizer:
                                   function_data: pd.DataFrame,
                                   connection_data: pd.DataFrame,
                                   output_function: int,
-                                  ax: Axes | None = None) -> Axes:
+                                  ax: Axes | None = None,
+                                  graph: GraphIndex | None = None) -> Axes:
         """
         Highlight all functions downstream of the specified function.
 
@@ -410,6 +423,9 @@ class Visualizer:
             The output function ID.
         ax : Axes, optional
             The Matplotlib axes. If None, then a new Axes is created.
+        graph : GraphIndex, optional
+            The adjacency index of the connections. If None, it is built from
+            the connection data.
 
         Returns
         -------
@@ -417,29 +433,20 @@ class Visualizer:
             Returns the Matplotlib Axes the FRAM model was rendered onto.
         """
 
-        function_stack = []
-        already_pathed = [output_function]
-        connections = dict.fromkeys(connection_data['Name'].unique(), 0.0)
-
-        # Add all functions this function outputs to
-        for index, row in connection_data.iterrows():
-            if row.outputFn == output_function:
-                function_stack.append(row.toFn)
-                connections[row.Name] = 0.1
-
-        # While all paths have not been searched
-        while len(function_stack) != 0:
-            current_function = function_stack.pop()
+        if graph is None:
+            graph = GraphIndex(function_data, connection_data)
 
-            if current_function in already_pathed:
-                continue
-
-            for index, row in connection_data.iterrows():
-                if row.outputFn == current_function:
-                    function_stack.append(row.toFn)
-                    connections[row.Name] = 0.1
+        # Highlight the outputs of the function and everything downstream
+        position = graph.position(output_function)
+        pathed = np.zeros(graph.number_of_functions, dtype=bool)
+        if position >= 0:
+            pathed = graph.reachable(position)
+            pathed[position] = True
 
-            already_pathed.append(current_function)
+        names = connection_data['Name'].to_numpy()
+        connections = dict.fromkeys(names, 0.0)
+        downstream = graph.known & pathed[graph.src]
+        connections.update(dict.fromkeys(names[downstream], 0.1))
 
         return self.render(function_data, connection_data,
                            real_connections=connections,
@@ -0,0 +1,323 @@
+import hashlib
+import os
+import zipfile
+from pathlib import Path
+from typing import Any, Mapping
+
+import numpy as np
+import pandas as pd
+
+from .xfmv_parser import parse_xfmv
+
+# Bump whenever the layout of the parsed tables changes, so that stale cache
+# entries are never loaded.
+CACHE_VERSION = 3
+
+# Default upper bound on the total size of a cache directory.
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(filename: str | os.PathLike) -> str:
+    """
+    Compute the cache key of an xfmv file.
+
+    The key combines the file size, modification time and a hash of the file
+    contents, so any change to the file results in a new key.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike
+        The .xfmv file.
+
+    Returns
+    -------
+    str
+        A hexadecimal cache key.
+    """
+
+    stat = os.stat(filename)
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{CACHE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}:"
+                  .encode())
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _pack_table(name: str,
+                df: pd.DataFrame,
+                arrays: dict[str, Any]) -> None:
+    """ Add the columns of a DataFrame to a dict of named arrays. """
+
+    arrays[f"{name}:columns"] = np.array(df.columns, dtype=str)
+
+    for column in df.columns:
+        key = f"{name}:{column}"
+        series = df[column]
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f"{key}:codes"] = series.cat.codes.to_numpy()
+            arrays[f"{key}:categories"] = np.array(series.cat.categories,
+                                                   dtype=str)
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            arrays[key] = series.to_numpy()
+        else:
+            # Strings are stored as their concatenated UTF-8 bytes and the
+            # offset of each, as a fixed-width array would pad every string
+            # to the longest
+            encoded = [value.encode()
+                       for value in series.fillna('').astype(str).tolist()]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            arrays[key] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+            arrays[f"{key}:offsets"] = offsets
+            arrays[f"{key}:null"] = series.isna().to_numpy()
+
+
+def _unpack_table(name: str,
+                  arrays: Mapping[str, np.ndarray]) -> pd.DataFrame:
+    """ Rebuild a DataFrame from its named arrays. """
+
+    columns: dict[str, Any] = {}
+    for column in arrays[f"{name}:columns"].tolist():
+        key = f"{name}:{column}"
+
+        if f"{key}:codes" in arrays:
+            categories = arrays[f"{key}:categories"].tolist()
+            columns[column] = pd.Categorical.from_codes(
+                arrays[f"{key}:codes"], categories=categories)
+        elif f"{key}:null" in arrays:
+            data = arrays[key].tobytes()
+            offsets = arrays[f"{key}:offsets"].tolist()
+            values: list[str | None] = [
+                data[start:end].decode()
+                for start, end in zip(offsets[:-1], offsets[1:])]
+            for row in np.flatnonzero(arrays[f"{key}:null"]).tolist():
+                values[row] = None
+            columns[column] = values
+        else:
+            columns[column] = arrays[key]
+
+    return pd.DataFrame(columns)
+
+
+def pack_tables(df_function: pd.DataFrame,
+                df_connection: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Convert the parsed tables of a model to a flat dict of NumPy arrays.
+
+    The arrays contain no Python objects, so they can be written with
+    np.savez or sent between processes as raw buffers.
+
+    Parameters
+    ----------
+    df_function : pd.DataFrame
+        The parsed function data.
+    df_connection : pd.DataFrame
+        The parsed connection data.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The columns of both tables, keyed by table and column name.
+    """
+
+    arrays: dict[str, Any] = {}
+    _pack_table('function', df_function, arrays)
+    _pack_table('connection', df_connection, arrays)
+
+    return arrays
+
+
+def unpack_tables(arrays: Mapping[str, np.ndarray]
+                  ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Rebuild the parsed tables of a model from the arrays of pack_tables.
+
+    Parameters
+    ----------
+    arrays : Mapping[str, np.ndarray]
+        The arrays returned by pack_tables, or an opened .npz file.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe containing the function data.
+    pd.DataFrame
+        A dataframe containing the connection data.
+    """
+
+    return _unpack_table('function', arrays), _unpack_table('connection',
+                                                            arrays)
+
+
+def _entry_path(cache_dir: str | os.PathLike,
+                key: str) -> Path:
+    """ The path of the cache entry with the given key. """
+
+    return Path(cache_dir) / f"{key}.npz"
+
+
+def _load_entry(entry: Path) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """ Load the tables stored in a cache entry, if it exists. """
+
+    if not entry.exists():
+        return None
+
+    try:
+        with np.load(entry, allow_pickle=False) as arrays:
+            tables = unpack_tables(arrays)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        # Corrupt or truncated entry. Drop it and re-parse.
+        entry.unlink(missing_ok=True)
+        return None
+
+    # Mark the entry as recently used for eviction.
+    os.utime(entry)
+
+    return tables
+
+
+def load_cached(filename: str | os.PathLike,
+                cache_dir: str | os.PathLike
+                ) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """
+    Load the parsed tables of an xfmv file from the cache.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike
+        The .xfmv file.
+    cache_dir : str | os.PathLike
+        The cache directory.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame] | None
+        The function and connection data, or None if the file is not cached.
+    """
+
+    return _load_entry(_entry_path(cache_dir, cache_key(filename)))
+
+
+def _store_entry(entry: Path,
+                 df_function: pd.DataFrame,
+                 df_connection: pd.DataFrame) -> None:
+    """ Write the tables to a cache entry. """
+
+    entry.parent.mkdir(parents=True, exist_ok=True)
+
+    arrays: dict[str, Any] = pack_tables(df_function, df_connection)
+
+    # Write to a temporary file first so readers never see partial entries.
+    tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, entry)
+
+
+def store_cached(filename: str | os.PathLike,
+                 cache_dir: str | os.PathLike,
+                 df_function: pd.DataFrame,
+                 df_connection: pd.DataFrame,
+                 max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """
+    Store the parsed tables of an xfmv file in the cache.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike
+        The .xfmv file.
+    cache_dir : str | os.PathLike
+        The cache directory. It is created if it does not exist.
+    df_function : pd.DataFrame
+        The parsed function data.
+    df_connection : pd.DataFrame
+        The parsed connection data.
+    max_bytes : int, optional
+        The maximum total size of the cache directory. The least recently
+        used entries are evicted once this is exceeded.
+    """
+
+    entry = _entry_path(cache_dir, cache_key(filename))
+    _store_entry(entry, df_function, df_connection)
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir: str | os.PathLike,
+          max_bytes: int = MAX_CACHE_BYTES) -> None:
+    """
+    Remove the least recently used cache entries until the cache fits.
+
+    Parameters
+    ----------
+    cache_dir : str | os.PathLike
+        The cache directory.
+    max_bytes : int, optional
+        The maximum total size of the cache directory.
+    """
+
+    entries = []
+    for entry in Path(cache_dir).glob('*.npz'):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
+def parse_xfmv_cached(filename: str | os.PathLike,
+                      cache_dir: str | os.PathLike,
+                      max_bytes: int = MAX_CACHE_BYTES,
+                      streaming: bool = False,
+                      engine: str | None = None
+                      ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Parse an xfmv file, reusing the cached tables when available.
+
+    On a cache hit the XML is not parsed at all. On a miss the file is
+    parsed with parse_xfmv and the result is stored in the cache.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike
+        A .xfmv file to parse.
+    cache_dir : str | os.PathLike
+        The cache directory.
+    max_bytes : int, optional
+        The maximum total size of the cache directory.
+    streaming : bool, optional
+        Passed to parse_xfmv on a cache miss. Defaults to False.
+    engine : {'lxml', 'etree'}, optional
+        Passed to parse_xfmv on a cache miss. Defaults to None.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe containing the function data.
+    pd.DataFrame
+        A dataframe containing the connection data.
+    """
+
+    entry = _entry_path(cache_dir, cache_key(filename))
+
+    cached = _load_entry(entry)
+    if cached is not None:
+        return cached
+
+    df_function, df_connection = parse_xfmv(filename, streaming=streaming,
+                                            engine=engine)
+    _store_entry(entry, df_function, df_connection)
+    evict(cache_dir, max_bytes)
+
+    return df_function, df_connection
@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+from .graph import GraphIndex, _csr, _gather
+from .xfmv_parser import ASPECTS
+
+# Convergence settings of the iterative centralities. Iteration stops once
+# the total change is below TOLERANCE per function.
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+# Upper bound on the number of search states (source and function or edge)
+# processed at once by betweenness, which bounds its memory use.
+BATCH_STATES = 1 << 21
+
+
+def degree(graph: GraphIndex,
+           keep: np.ndarray) -> pd.DataFrame:
+    """
+    The number of connections into and out of each function, per aspect.
+
+    The in_<aspect> columns count the connections that end at that aspect of
+    the function. The out_<aspect> columns count the connections from the
+    output of the function that end at that aspect of another function.
+    """
+
+    n = graph.number_of_functions
+    columns = {}
+    for side, ends in [('in', graph.dst), ('out', graph.src)]:
+        for code, aspect in enumerate(ASPECTS):
+            if aspect == 'O':
+                continue
+            selected = keep & (graph.aspect == code)
+            columns[f'{side}_{aspect}'] = np.bincount(ends[selected],
+                                                      minlength=n)
+        columns[side] = np.bincount(ends[keep], minlength=n)
+
+    return pd.DataFrame(columns)
+
+
+def pagerank(graph: GraphIndex,
+             keep: np.ndarray,
+             damping: float = 0.85) -> np.ndarray:
+    """
+    The PageRank of each function, by power iteration.
+
+    Repeated connections between two functions add to the weight of the
+    link. The rank of functions with no outputs is spread evenly over all
+    functions.
+    """
+
+    n = graph.number_of_functions
+    src, dst = graph.src[keep], graph.dst[keep]
+
+    out_weight = np.bincount(src, minlength=n).astype(np.float64)
+    dangling = out_weight == 0
+    out_weight[dangling] = 1.0
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        share = x / out_weight
+        y = damping * np.bincount(dst, weights=share[src], minlength=n)
+        y += (damping * x[dangling].sum() + 1.0 - damping) / n
+
+        converged = np.abs(y - x).sum() < n * TOLERANCE
+        x = y
+        if converged:
+            break
+
+    return x
+
+
+def eigenvector(graph: GraphIndex,
+                keep: np.ndarray) -> np.ndarray:
+    """
+    The eigenvector centrality of each function, by power iteration.
+
+    A function is central if central functions connect to it. Repeated
+    connections between two functions add to the weight of the link. The
+    iteration uses the shifted matrix I + A, which has the same eigenvectors
+    but also converges when the connections are periodic. The result has
+    unit norm.
+    """
+
+    n = graph.number_of_functions
+    src, dst = graph.src[keep], graph.dst[keep]
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        y = x + np.bincount(dst, weights=x[src], minlength=n)
+        norm = np.linalg.norm(y)
+        if norm > 0:
+            y = y / norm
+
+        converged = np.abs(y - x).sum() < n * TOLERANCE
+        x = y
+        if converged:
+            break
+
+    return x
+
+
+def betweenness(graph: GraphIndex,
+                keep: np.ndarray,
+                sources: np.ndarray | None = None) -> np.ndarray:
+    """
+    The betweenness centrality of each function.
+
+    This is Brandes' algorithm, with the breadth-first searches from many
+    sources run together, a whole frontier at a time. Paths are counted
+    between functions, so repeated connections between two functions count
+    once. The result is normalized by (n - 1)(n - 2), the number of ordered
+    pairs of other functions.
+
+    If sources is given, only paths from those sources are counted and the
+    result is scaled up to estimate the exact centrality.
+    """
+
+    n = graph.number_of_functions
+    if sources is None:
+        sources = np.arange(n)
+
+    # One edge per connected pair of distinct functions
+    pairs = np.unique(graph.src[keep] * n + graph.dst[keep])
+    src, dst = pairs // n, pairs % n
+    simple = src != dst
+    src, dst = src[simple], dst[simple]
+    offsets, edges = _csr(src, n)
+    successors = dst[edges]
+
+    centrality = np.zeros(n)
+    batch = max(1, BATCH_STATES // (n + len(src) + 1))
+    for start in range(0, len(sources), batch):
+        block = sources[start:start + batch]
+        centrality += _dependencies(offsets, successors, block)
+
+    if len(sources) < n and len(sources) > 0:
+        centrality *= n / len(sources)
+    if n > 2:
+        centrality /= (n - 1) * (n - 2)
+
+    return centrality
+
+
+def _dependencies(offsets: np.ndarray,
+                  successors: np.ndarray,
+                  sources: np.ndarray) -> np.ndarray:
+    """
+    The summed Brandes dependencies of each function on a block of sources.
+
+    Each search state is a flat key b * n + v, for source b of the block and
+    function v, so all searches advance together.
+    """
+
+    n = len(offsets) - 1
+    size = len(sources) * n
+
+    dist = np.full(size, -1, dtype=np.int64)
+    sigma = np.zeros(size)
+
+    frontier = np.arange(len(sources)) * n + sources
+    dist[frontier] = 0
+    sigma[frontier] = 1.0
+
+    # The shortest path edges found at each level, as (parent, child) keys
+    levels = []
+    slot = np.empty(size, dtype=np.int64)
+    depth = 0
+
+    while len(frontier):
+        base, v = np.divmod(frontier, n)
+        lengths = offsets[v + 1] - offsets[v]
+        parent = np.repeat(frontier, lengths)
+        child = np.repeat(base * n, lengths) + _gather(offsets, successors, v)
+
+        dist[child[dist[child] < 0]] = depth + 1
+        tree = dist[child] == depth + 1
+        parent, child = parent[tree], child[tree]
+
+        # Parents are complete, as all shorter paths were counted first
+        np.add.at(sigma, child, sigma[parent])
+        levels.append((parent, child))
+
+        rank = np.arange(len(child))
+        slot[child] = rank
+        frontier = child[slot[child] == rank]
+        depth += 1
+
+    delta = np.zeros(size)
+    for parent, child in reversed(levels):
+        np.add.at(delta, parent,
+                  sigma[parent] / sigma[child] * (1.0 + delta[child]))
+
+    delta[np.arange(len(sources)) * n + sources] = 0.0
+
+    return delta.reshape(len(sources), n).sum(axis=0)
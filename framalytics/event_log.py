@@ -0,0 +1,406 @@
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, TypeAlias
+
+import numpy as np
+import pandas as pd
+
+from .observations import (CHUNK_ROWS, PARQUET_SUFFIXES, ObservationMatrix,
+                           parquet_files)
+
+# The largest number of function pairs counted into a dense array by
+# directly_follows. More pairs are counted by hashing.
+DENSE_PAIRS = 1 << 24
+
+# An event log given as a DataFrame, an iterable of DataFrame chunks, or the
+# path of a CSV file, a Parquet file or a directory of Parquet files.
+EventSource: TypeAlias = (pd.DataFrame | Iterable[pd.DataFrame] | str
+                          | os.PathLike)
+
+
+def iter_events(source: EventSource,
+                columns: list[str],
+                chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over the events of an event log in chunks.
+
+    Parameters
+    ----------
+    source : EventSource
+        A DataFrame with one event per row, an iterable of chunks of one, the
+        path of a CSV file, optionally compressed, or the path of a Parquet
+        file or directory of Parquet files.
+    columns : list[str]
+        The columns needed. Only these columns are read from files.
+    chunksize : int, optional
+        The number of events in each chunk read from a file or DataFrame.
+
+    Yields
+    ------
+    pd.DataFrame
+        Chunks of events.
+    """
+
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    elif isinstance(source, (str, os.PathLike)):
+        if (os.path.isdir(source)
+                or Path(source).suffix.lower() in PARQUET_SUFFIXES):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet event logs requires the "
+                                  "pyarrow package.")
+
+            for file in parquet_files(source):
+                with pq.ParquetFile(file) as reader:
+                    for batch in reader.iter_batches(batch_size=chunksize,
+                                                     columns=columns):
+                        yield batch.to_pandas()
+            return
+
+        with pd.read_csv(source, usecols=columns,
+                         chunksize=chunksize) as reader:
+            yield from reader
+    else:
+        yield from source
+
+
+class _Cases:
+    """
+    Assigns each case a row, in the order the cases are first seen.
+
+    Cases are found by hashing, never by sorting, so the events of a case
+    may arrive in any order and in any chunk. The known cases are held in
+    levels of hashed indexes covering consecutive rows, as in a log
+    structured merge tree. New cases form a new level, and levels of similar
+    size are merged, so each case is hashed O(log cases) times in all.
+    """
+
+    def __init__(self) -> None:
+        self.levels: list[pd.Index] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self,
+               cases: pd.Series) -> np.ndarray:
+        """ The row of each case, adding new cases. Missing cases are -1. """
+
+        codes, uniques = pd.factorize(cases)
+        uniques = pd.Index(uniques)
+
+        unique_rows = np.full(len(uniques), -1, dtype=np.int64)
+        missing = np.arange(len(uniques))
+        start = 0
+        for level in self.levels:
+            found = level.get_indexer(uniques[missing])
+            hit = found >= 0
+            unique_rows[missing[hit]] = start + found[hit]
+            missing = missing[~hit]
+            start += len(level)
+
+        if len(missing):
+            unique_rows[missing] = self.count + np.arange(len(missing))
+            self.count += len(missing)
+            self.levels.append(uniques[missing])
+            while (len(self.levels) > 1
+                   and len(self.levels[-2]) <= 2 * len(self.levels[-1])):
+                newest = self.levels.pop()
+                self.levels[-1] = self.levels[-1].append(newest)
+
+        return np.where(codes >= 0, unique_rows[codes], -1)
+
+    def index(self) -> pd.Index:
+        """ The case of each row. """
+
+        if not self.levels:
+            return pd.Index([])
+
+        return self.levels[0].append(self.levels[1:])
+
+
+def _sum_by_key(keys: np.ndarray,
+                counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Add up the counts of equal keys, by hashing. """
+
+    codes, unique = pd.factorize(keys)
+    totals = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(totals, codes, counts)
+
+    return unique, totals
+
+
+class _KeyCounts:
+    """
+    Counts integer keys by hashing, a chunk of keys at a time.
+
+    Each chunk is counted on its own, then kept in levels that are merged
+    when they reach a similar size, as in _Cases. So each distinct key is
+    merged O(log chunks) times, rather than once per chunk.
+    """
+
+    def __init__(self) -> None:
+        self.levels: list[tuple[np.ndarray, np.ndarray]] = []
+
+    def add(self,
+            keys: np.ndarray) -> None:
+        """ Count a chunk of keys. """
+
+        codes, unique = pd.factorize(keys)
+        self.levels.append((unique, np.bincount(codes,
+                                                minlength=len(unique))))
+
+        while (len(self.levels) > 1
+               and len(self.levels[-2][0]) <= 2 * len(self.levels[-1][0])):
+            self.levels[-2:] = [self._merge(self.levels[-2:])]
+
+    @staticmethod
+    def _merge(levels: list[tuple[np.ndarray, np.ndarray]]
+               ) -> tuple[np.ndarray, np.ndarray]:
+        return _sum_by_key(np.concatenate([keys for keys, _ in levels]),
+                           np.concatenate([counts for _, counts in levels]))
+
+    def totals(self) -> tuple[np.ndarray, np.ndarray]:
+        """ The distinct keys, in increasing order, and their counts. """
+
+        if not self.levels:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        keys, counts = self._merge(self.levels)
+        order = np.argsort(keys)
+
+        return keys[order].astype(np.int64), counts[order].astype(np.int64)
+
+
+def events_to_observations(source: EventSource,
+                           functions: Iterable[str],
+                           case_column: str = 'case_id',
+                           function_column: str = 'function',
+                           chunksize: int = CHUNK_ROWS
+                           ) -> tuple[ObservationMatrix, pd.Index]:
+    """
+    Convert an event log to bit-packed observations of functions.
+
+    Each case of the log becomes one observation, in which a function is
+    present if the case has at least one event of it. The log is streamed in
+    chunks, and each event sets one bit, so the memory used depends on the
+    number of cases, not the number of events, and logs larger than memory
+    can be converted. Events may be in any order: cases are matched by
+    hashing rather than sorting, and the events of a case may be spread
+    over any number of chunks.
+
+    Parameters
+    ----------
+    source : EventSource
+        The event log: a DataFrame with one event per row, an iterable of
+        chunks of one, the path of a CSV file, optionally compressed, or the
+        path of a Parquet file or directory of Parquet files.
+    functions : Iterable[str]
+        The functions, in the order of the columns of the observations, as
+        named in the function column. Events of other functions are ignored.
+    case_column : str, optional
+        The column identifying the case of each event. Events with no case
+        are ignored. Defaults to 'case_id'.
+    function_column : str, optional
+        The column naming the function of each event. Defaults to
+        'function'.
+    chunksize : int, optional
+        The number of events read at a time. Defaults to 100,000.
+
+    Returns
+    -------
+    ObservationMatrix
+        The packed observations, one row per case and one column per
+        function. These can be counted with FRAM.count_connections using the
+        'functions' column type, under which a connection is present when
+        both of its functions are.
+    pd.Index
+        The case of each row, in the order the cases were first seen.
+
+    Examples
+    --------
+    >>> import framalytics
+    >>> from framalytics.event_log import events_to_observations
+    >>>
+    >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+    >>> observations, cases = events_to_observations(
+    ...     'events.csv.gz', fram.get_functions().values())
+    >>> fram.highlight_data(observations)
+    """
+
+    columns = pd.Index(functions)
+    width = (len(columns) + 7) // 8
+
+    cases = _Cases()
+    bits = np.zeros((0, width), dtype=np.uint8)
+
+    for chunk in iter_events(source, [case_column, function_column],
+                             chunksize):
+        rows = cases.lookup(chunk[case_column])
+        positions = columns.get_indexer(chunk[function_column])
+        kept = (rows >= 0) & (positions >= 0)
+        rows, positions = rows[kept], positions[kept]
+
+        # Grow the rows geometrically, so each is copied O(1) times
+        if len(cases) > len(bits):
+            grown = np.zeros((max(len(cases), 2 * len(bits)), width),
+                             dtype=np.uint8)
+            grown[:len(bits)] = bits
+            bits = grown
+
+        np.bitwise_or.at(bits, (rows, positions >> 3),
+                         (0x80 >> (positions & 7)).astype(np.uint8))
+
+    return (ObservationMatrix(bits[:len(cases)], columns, packed=True),
+            cases.index().rename(case_column))
+
+
+def directly_follows(source: EventSource,
+                     functions: Iterable[str],
+                     case_column: str = 'case_id',
+                     function_column: str = 'function',
+                     time_column: str | None = 'timestamp',
+                     chunksize: int = CHUNK_ROWS
+                     ) -> tuple[pd.DataFrame, pd.Index]:
+    """
+    Count the directly-follows transitions between functions in an event log.
+
+    A transition from function a to function b is counted each time an event
+    of b directly follows an event of a in the same case. Each transition is
+    encoded as the integer key a * len(functions) + b, and the keys are
+    counted into a dense array with np.bincount, or by hashing if there are
+    too many pairs of functions for that. The log is streamed in chunks,
+    keeping only the last function of each case between chunks.
+
+    Events of functions not in functions are not skipped, as that would
+    join the events either side of them into a transition that never
+    happened. These functions are numbered after functions, in the order
+    they are first seen, and the transitions into and out of them are
+    counted by hashing.
+
+    Within a chunk, events may be in any order, as they are ordered by case
+    and time. The events of a case in different chunks must be in time
+    order, as they are in a log sorted by time or by case. A DataFrame is
+    sorted by time first, if needed.
+
+    Parameters
+    ----------
+    source : EventSource
+        The event log: a DataFrame with one event per row, an iterable of
+        chunks of one, the path of a CSV file, optionally compressed, or the
+        path of a Parquet file or directory of Parquet files.
+    functions : Iterable[str]
+        The functions, as named in the function column.
+    case_column : str, optional
+        The column identifying the case of each event. Events with no case
+        are left out. Defaults to 'case_id'.
+    function_column : str, optional
+        The column naming the function of each event. An event with no
+        function ends the chain of transitions of its case. Defaults to
+        'function'.
+    time_column : str, optional
+        The column ordering the events of each case. If None, events are
+        taken to be in order. Defaults to 'timestamp'.
+    chunksize : int, optional
+        The number of events read at a time. Defaults to 100,000.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per observed transition. The 'from' and 'to' columns are the
+        positions of the functions in the returned index, and 'count' is the
+        number of times the transition was observed.
+    pd.Index
+        The function at each position: functions, followed by the other
+        functions of the log, in the order they were first seen.
+    """
+
+    columns = pd.Index(functions)
+    n = len(columns)
+    dense = n * n <= DENSE_PAIRS
+
+    if (time_column is not None and isinstance(source, pd.DataFrame)
+            and not source[time_column].is_monotonic_increasing):
+        source = source.iloc[np.argsort(source[time_column].to_numpy(),
+                                        kind='stable')]
+
+    needed = [case_column, function_column]
+    if time_column is not None:
+        needed.append(time_column)
+
+    cases = _Cases()
+    others = _Cases()
+    last = np.zeros(0, dtype=np.int64)
+    if dense:
+        totals = np.zeros(n * n, dtype=np.int64)
+    else:
+        counted = _KeyCounts()
+    # Transitions into or out of functions not in functions, keyed by the
+    # two positions in the high and low 32 bits
+    outside = _KeyCounts()
+
+    for chunk in iter_events(source, needed, chunksize):
+        rows = cases.lookup(chunk[case_column])
+        names = chunk[function_column]
+        positions = columns.get_indexer(names).astype(np.int64)
+        unknown = positions < 0
+        if unknown.any():
+            found = others.lookup(names[unknown])
+            positions[unknown] = np.where(found >= 0, n + found, -1)
+        kept = rows >= 0
+
+        # The events of each case together, in time order
+        rows, positions = rows[kept], positions[kept]
+        if time_column is None:
+            order = np.argsort(rows, kind='stable')
+        else:
+            order = np.lexsort((chunk[time_column].to_numpy()[kept], rows))
+        rows, positions = rows[order], positions[order]
+
+        if len(cases) > len(last):
+            grown = np.full(max(len(cases), 2 * len(last)), -1,
+                            dtype=np.int64)
+            grown[:len(last)] = last
+            last = grown
+
+        # Each event follows the one before it in its case, and the first
+        # event of a case in the chunk follows the case's last event so far.
+        # An event with no function has position -1, so nothing follows it.
+        starts = np.ones(len(rows), dtype=bool)
+        starts[1:] = rows[1:] != rows[:-1]
+        previous = np.empty_like(positions)
+        previous[1:] = positions[:-1]
+        previous[starts] = last[rows[starts]]
+
+        ends = np.ones(len(rows), dtype=bool)
+        ends[:-1] = starts[1:]
+        last[rows[ends]] = positions[ends]
+
+        follows = (previous >= 0) & (positions >= 0)
+        inside = follows & (previous < n) & (positions < n)
+        keys = previous[inside] * n + positions[inside]
+        if dense:
+            totals += np.bincount(keys, minlength=n * n)
+        else:
+            counted.add(keys)
+
+        crossing = follows & ~inside
+        if crossing.any():
+            outside.add((previous[crossing] << 32) | positions[crossing])
+
+    if dense:
+        keys = np.flatnonzero(totals)
+        counts = totals[keys]
+    else:
+        keys, counts = counted.totals()
+    crossing_keys, crossing_counts = outside.totals()
+
+    transitions = pd.DataFrame({
+        'from': np.concatenate([keys // max(n, 1), crossing_keys >> 32]),
+        'to': np.concatenate([keys % max(n, 1), crossing_keys & 0xFFFFFFFF]),
+        'count': np.concatenate([counts, crossing_counts])})
+
+    return transitions, columns.append(others.index()).rename(function_column)
@@ -1,8 +1,54 @@
+import os
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
 import pandas as pd
 from matplotlib.axes import Axes
 
+from . import centrality as _centrality
 from .FRAM_Visualizer import Visualizer
-from .xfmv_parser import parse_xfmv
+from .cache import pack_tables, parse_xfmv_cached, unpack_tables
+from .event_log import EventSource, directly_follows
+from .graph import GraphIndex
+from .observations import (CHUNK_ROWS, ConnectionCounter, ObservationMatrix,
+                           ObservationSource, count_parallel,
+                           iter_observations)
+from .xfmv_parser import (ASPECTS, XfmvSource, parse_xfmv,
+                          parse_xfmv_functions)
+
+
+def _parse(filename: XfmvSource,
+           streaming: bool,
+           engine: str | None,
+           cache_dir: str | None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """ Parse an .xfmv file, through the cache if a directory is given. """
+
+    if cache_dir is None:
+        return parse_xfmv(filename, streaming=streaming, engine=engine)
+
+    if not isinstance(filename, (str, os.PathLike)):
+        raise ValueError("Caching requires an .xfmv file name.")
+
+    return parse_xfmv_cached(filename, cache_dir, streaming=streaming,
+                             engine=engine)
+
+
+def _parse_packed(filename: str,
+                  streaming: bool,
+                  engine: str | None,
+                  cache_dir: str | None) -> dict[str, np.ndarray]:
+    """ Parse an .xfmv file into plain arrays, for use in worker processes. """
+
+    try:
+        tables = _parse(filename, streaming, engine, cache_dir)
+    except SyntaxError as e:
+        # lxml syntax errors hold their error log, which cannot be pickled
+        # back to the parent process
+        raise ET.ParseError(str(e)) from None
+
+    return pack_tables(*tables)
 
 
 class FRAM:
@@ -15,14 +61,37 @@ class FRAM:
     """
 
     def __init__(self,
-                 filename: str):
+                 filename: XfmvSource,
+                 streaming: bool = False,
+                 engine: str | None = None,
+                 cache_dir: str | None = None,
+                 lazy: bool = False):
         """
         Initialize a FRAM object from an .xfmv file.
 
         Parameters
         ----------
-        filename : str
-            The name of the .xfmv file to read.
+        filename : str | os.PathLike | bytes | BinaryIO
+            The name of the .xfmv file to read. The raw contents of the file
+            (bytes, bytearray or memoryview) or an open binary file object may
+            be given instead. Gzip and zstd compressed files are decompressed
+            on the fly.
+        streaming : bool, optional
+            If True, parse the .xfmv file in a single streaming pass, which
+            keeps memory bounded for very large models. Defaults to False.
+        engine : {'lxml', 'etree'}, optional
+            The XML engine used to parse the .xfmv file. Defaults to None, for
+            the fastest available engine.
+        cache_dir : str, optional
+            A directory in which to cache the parsed model. When the same
+            unchanged .xfmv file is loaded again, the cached tables are used
+            and the XML is not parsed. Defaults to None, for no caching.
+        lazy : bool, optional
+            If True, only the functions are parsed on construction. The
+            connections are parsed the first time they are needed. This makes
+            listing and searching the functions of many models faster. Lazy
+            loading is not used for open file objects or with a cache_dir,
+            whose models are always loaded in full. Defaults to False.
 
         Examples
         --------
@@ -31,23 +100,194 @@ class FRAM:
         >>> fram = framalytics.FRAM('my-fram-model.xfmv')
         """
 
-        self.filename = filename
+        self.filename = None
+        if isinstance(filename, (str, os.PathLike)):
+            self.filename = str(filename)
 
-        fram_data = parse_xfmv(filename)
-        self._function_data = fram_data[0]
-        self._connection_data = fram_data[1]
+        # The source of the connections, when they are yet to be parsed
+        self._lazy_source: tuple[XfmvSource, bool, str | None] | None = None
+
+        rereadable = isinstance(filename, (str, os.PathLike, bytes,
+                                           bytearray, memoryview))
+        if lazy and rereadable and cache_dir is None:
+            self._lazy_source = (filename, streaming, engine)
+            self._set_tables(parse_xfmv_functions(filename, engine=engine),
+                             None)
+        else:
+            self._set_tables(*_parse(filename, streaming, engine, cache_dir))
+
+    def _set_tables(self,
+                    function_data: pd.DataFrame,
+                    connection_data: pd.DataFrame | None) -> None:
+        """ Set the parsed model tables and build the function lookups. """
+
+        self._function_data = function_data
+        self._connections = connection_data
+        self._graph_index: GraphIndex | None = None
 
         self.visualizer = Visualizer()
-        self.functions_by_id = {}
-        self.functions_by_name = {}
-        self.functions_descriptions_by_id = {}
 
-        for index, row in self._function_data.iterrows():
-            self.functions_by_id.update({int(row.IDNr): row.IDName})
-            self.functions_by_name.update({row.IDName: int(row.IDNr)})
-            self.functions_descriptions_by_id.update(
-                {int(row.IDNr): row.Description}
-            )
+        ids = self._function_data['IDNr'].tolist()
+        names = self._function_data['IDName'].tolist()
+        descriptions = self._function_data['Description'].tolist()
+
+        self.functions_by_id = dict(zip(ids, names))
+        self.functions_by_name = dict(zip(names, ids))
+        self.functions_descriptions_by_id = dict(zip(ids, descriptions))
+
+    @property
+    def _connection_data(self) -> pd.DataFrame:
+        """ The connection data, parsed on first access if loaded lazily. """
+
+        if self._connections is None:
+            assert self._lazy_source is not None
+            filename, streaming, engine = self._lazy_source
+            _, self._connections = parse_xfmv(filename, streaming=streaming,
+                                              engine=engine)
+            self._lazy_source = None
+
+        return self._connections
+
+    @property
+    def _graph(self) -> GraphIndex:
+        """ The adjacency index of the connections, built on first access. """
+
+        if self._graph_index is None:
+            self._graph_index = GraphIndex(self._function_data,
+                                           self._connection_data)
+
+        return self._graph_index
+
+    def _function_id(self,
+                     function: str | int) -> int:
+        """ Return the ID of a function given by ID (int) or name (str). """
+
+        if isinstance(function, str):
+            return self.get_function_id(function)
+        elif isinstance(function, (int, np.integer)):
+            return int(function)
+        else:
+            raise ValueError("A function ID or name is required.")
+
+    def _functions_by_position(self,
+                               neighbors: Callable[..., np.ndarray],
+                               position: int,
+                               *args: str) -> dict:
+        """
+        Return a dict of (ID, name) of the neighbours of a function.
+
+        The neighbours are found by calling one of the GraphIndex neighbour
+        methods. Unknown functions have no neighbours.
+        """
+
+        if position < 0:
+            return {}
+
+        ids = self._graph.ids[neighbors(position, *args)].tolist()
+        return {id: self.functions_by_id[id] for id in ids}
+
+    @classmethod
+    def load_many(cls,
+                  filenames: Iterable[str],
+                  workers: int | None = None,
+                  streaming: bool = False,
+                  engine: str | None = None,
+                  cache_dir: str | None = None,
+                  errors: str = "raise") -> dict[str, 'FRAM | Exception']:
+        """
+        Load many .xfmv files in parallel.
+
+        The files are parsed across a pool of worker processes. Each worker
+        sends back the parsed tables as plain NumPy arrays, which are cheap
+        to transfer between processes.
+
+        Parameters
+        ----------
+        filenames : Iterable[str]
+            The .xfmv files to read.
+        workers : int, optional
+            The number of worker processes. If 1, the files are parsed in the
+            current process. If None, one worker per CPU is used. Defaults to
+            None.
+        streaming : bool, optional
+            Parse each file in a single streaming pass. Defaults to False.
+        engine : {'lxml', 'etree'}, optional
+            The XML engine used to parse each file. Defaults to None, for the
+            fastest available engine.
+        cache_dir : str, optional
+            A directory in which to cache the parsed models. Defaults to None,
+            for no caching.
+        errors : {'raise', 'return'}
+            If 'raise', a ValueError listing every file that failed to load is
+            raised once all files have been processed. If 'return', the
+            exception raised for a file is returned in place of its FRAM
+            object. Defaults to 'raise'.
+
+        Returns
+        -------
+        dict
+            The FRAM object (or exception) of each file, keyed by filename in
+            the order given.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>> from pathlib import Path
+        >>>
+        >>> files = [str(f) for f in Path('models').glob('*.xfmv')]
+        >>> frams = framalytics.FRAM.load_many(files, workers=4)
+        """
+
+        errors = errors.lower()
+        if errors not in ['raise', 'return']:
+            raise ValueError("errors must be 'raise' or 'return'.")
+
+        filenames = list(dict.fromkeys(filenames))
+        results: dict[str, FRAM | Exception] = {}
+
+        if workers == 1:
+            for filename in filenames:
+                try:
+                    arrays = _parse_packed(filename, streaming, engine,
+                                           cache_dir)
+                    results[filename] = cls._from_packed(filename, arrays)
+                except Exception as e:
+                    results[filename] = e
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {filename: executor.submit(_parse_packed, filename,
+                                                     streaming, engine,
+                                                     cache_dir)
+                           for filename in filenames}
+
+                for filename, future in futures.items():
+                    try:
+                        results[filename] = cls._from_packed(filename,
+                                                             future.result())
+                    except Exception as e:
+                        results[filename] = e
+
+        failed = {filename: result for filename, result in results.items()
+                  if isinstance(result, Exception)}
+        if failed and errors == 'raise':
+            message = "\n".join(f"{filename}: {error!r}"
+                                for filename, error in failed.items())
+            raise ValueError(f"Failed to load {len(failed)} file(s):\n"
+                             f"{message}")
+
+        return results
+
+    @classmethod
+    def _from_packed(cls,
+                     filename: str,
+                     arrays: dict[str, np.ndarray]) -> 'FRAM':
+        """ Create a FRAM object from the arrays of pack_tables. """
+
+        fram = cls.__new__(cls)
+        fram.filename = filename
+        fram._lazy_source = None
+        fram._set_tables(*unpack_tables(arrays))
+        return fram
 
     def _get_function_metadata(self) -> pd.DataFrame:
         """
@@ -243,21 +483,10 @@ class FRAM:
             aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
-        else:
-            raise ValueError("A function ID or name is required.")
-
-        function_inputs = {}  # {key=id, value=name}
-
-        for index, row in self._connection_data.iterrows():
-            if row['toFn'] == id and row['toAspect'] == "I":
-                outputfn_name = self.get_function_name(row['outputFn'])
-                function_inputs.update({row['outputFn']: outputfn_name})
-
-        return function_inputs
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.predecessors,
+                                           self._graph.position(id),
+                                           'I')
 
     def get_function_outputs(self,
                              function: str | int) -> dict:
@@ -280,21 +509,9 @@ class FRAM:
             aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
-        else:
-            raise ValueError("A function ID or name is required.")
-
-        function_outputs = {}  # {key=id, value=name}
-
-        for index, row in self._connection_data.iterrows():
-            if row['outputFn'] == id:
-                tofn_name = self.get_function_name(row['toFn'])
-                function_outputs.update({row['toFn']: tofn_name})
-
-        return function_outputs
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.successors,
+                                           self._graph.position(id))
 
     def get_function_preconditions(self,
                                    function: str | int) -> dict:
@@ -318,21 +535,10 @@ class FRAM:
             precondition aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
-        else:
-            raise ValueError("A function ID or name is required.")
-
-        function_preconditions = {}  # {key=id, value=name}
-
-        for index, row in self._connection_data.iterrows():
-            if row['toFn'] == id and row['toAspect'] == "P":
-                outputfn_name = self.get_function_name(row['outputFn'])
-                function_preconditions.update({row['outputFn']: outputfn_name})
-
-        return function_preconditions
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.predecessors,
+                                           self._graph.position(id),
+                                           'P')
 
     def get_function_resources(self,
                                function: str | int) -> dict:
@@ -355,21 +561,10 @@ class FRAM:
             resource aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
-        else:
-            raise ValueError("A function ID or name is required.")
-
-        function_resources = {}  # {key=id, value=name}
-
-        for index, row in self._connection_data.iterrows():
-            if row['toFn'] == id and row['toAspect'] == "R":
-                outputfn_name = self.get_function_name(row['outputFn'])
-                function_resources.update({row['outputFn']: outputfn_name})
-
-        return function_resources
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.predecessors,
+                                           self._graph.position(id),
+                                           'R')
 
     def get_function_controls(self,
                               function: str | int) -> dict:
@@ -392,21 +587,10 @@ class FRAM:
             control aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
-        else:
-            raise ValueError("A function ID or name is required.")
-
-        function_controls = {}  # {key=id, value=name}
-
-        for index, row in self._connection_data.iterrows():
-            if row['toFn'] == id and row['toAspect'] == "C":
-                outputfn_name = self.get_function_name(row['outputFn'])
-                function_controls.update({row['outputFn']: outputfn_name})
-
-        return function_controls
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.predecessors,
+                                           self._graph.position(id),
+                                           'C')
 
     def get_function_times(self,
                            function: str | int) -> dict:
@@ -428,21 +612,478 @@ class FRAM:
             time aspect of the specified function.
         """
 
-        if isinstance(function, str):
-            id = self.get_function_id(function)
-        elif isinstance(function, int):
-            id = function
+        id = self._function_id(function)
+        return self._functions_by_position(self._graph.predecessors,
+                                           self._graph.position(id),
+                                           'T')
+
+    def neighbors(self,
+                  functions: Iterable[str | int] | None = None,
+                  aspects: Iterable[str] | None = None,
+                  direction: str = "in") -> pd.DataFrame:
+        """
+        Get the neighbours of many functions at once.
+
+        A long-form DataFrame is returned with one row per connection. The
+        'function' column is the ID of the queried function, 'neighbor' the
+        ID of the function at the other end of the connection, and 'aspect'
+        the aspect the connection ends at. Rows are grouped by function, in
+        the order of the function table.
+
+        Parameters
+        ----------
+        functions : Iterable[str | int], optional
+            The IDs (int) or names (str) of the functions to query. If None,
+            all functions are queried. Defaults to None.
+        aspects : Iterable[str], optional
+            Only include connections that end at these aspects, from
+            {'I', 'P', 'R', 'C', 'T'}. If None, all connections are included.
+            Defaults to None.
+        direction : {'in', 'out'}
+            If 'in', the neighbours are the functions that connect to the
+            queried functions. If 'out', they are the functions the output of
+            the queried functions connects to. Defaults to 'in'.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame with the function, neighbor and aspect columns.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> fram.neighbors(['Function A', 'Function B'], aspects=['I', 'C'])
+           function  neighbor aspect
+        0         0         1      I
+        1         1         2      C
+        2         1         0      I
+        """
+
+        direction = direction.lower()
+        if direction not in ['in', 'out']:
+            raise ValueError("direction must be 'in' or 'out'.")
+
+        graph = self._graph
+        if direction == 'in':
+            own, other = graph.dst, graph.src
         else:
-            raise ValueError("A function ID or name is required.")
+            own, other = graph.src, graph.dst
+
+        mask = graph.edge_mask(aspects)
+
+        if functions is not None:
+            ids = [self._function_id(f) for f in functions]
+            positions = graph.positions(ids)
+            if (positions < 0).any():
+                raise ValueError("No such function ID exists.")
+
+            selected = np.zeros(graph.number_of_functions, dtype=bool)
+            selected[positions] = True
+            mask &= selected[own]
+
+        edges = np.flatnonzero(mask)
+        edges = edges[np.argsort(own[edges], kind='stable')]
+
+        return pd.DataFrame({
+            'function': graph.ids[own[edges]],
+            'neighbor': graph.ids[other[edges]],
+            'aspect': pd.Categorical.from_codes(graph.aspect[edges],
+                                                categories=pd.Index(ASPECTS))})
+
+    def downstream(self,
+                   function: str | int) -> dict:
+        """
+        Get all functions downstream of the given function.
+
+        A function is downstream if it can be reached by following
+        connections forward from the output of the given function. The given
+        function is only included if it lies on a feedback loop.
+
+        Parameters
+        ----------
+        function : str | int
+            The ID (int) or name (str) of the desired function.
+
+        Returns
+        -------
+        dict
+            A dictionary consisting of the (ID, name) of each downstream
+            function.
+        """
+
+        id = self._function_id(function)
+        return self._functions_by_position(self._reachable,
+                                           self._graph.position(id),
+                                           'out')
+
+    def upstream(self,
+                 function: str | int) -> dict:
+        """
+        Get all functions upstream of the given function.
+
+        A function is upstream if the given function can be reached by
+        following connections forward from its output. The given function is
+        only included if it lies on a feedback loop.
+
+        Parameters
+        ----------
+        function : str | int
+            The ID (int) or name (str) of the desired function.
+
+        Returns
+        -------
+        dict
+            A dictionary consisting of the (ID, name) of each upstream
+            function.
+        """
+
+        id = self._function_id(function)
+        return self._functions_by_position(self._reachable,
+                                           self._graph.position(id),
+                                           'in')
+
+    def _reachable(self,
+                   position: int,
+                   direction: str) -> np.ndarray:
+        """ The positions of the functions reachable from a function. """
+
+        return np.flatnonzero(self._graph.reachable(position, direction))
+
+    def can_influence(self,
+                      source: str | int,
+                      target: str | int) -> bool:
+        """
+        Whether one function can influence another.
+
+        A function influences another if there is a path of connections from
+        its output to the other function. The first call computes the
+        transitive closure of the model, stored as packed bitsets, after which
+        each query takes constant time.
+
+        Parameters
+        ----------
+        source : str | int
+            The ID (int) or name (str) of the influencing function.
+        target : str | int
+            The ID (int) or name (str) of the influenced function.
+
+        Returns
+        -------
+        bool
+            True if the target function is downstream of the source function.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> fram.can_influence('Function C', 'Function E')
+        True
+        """
+
+        source_position = self._graph.position(self._function_id(source))
+        target_position = self._graph.position(self._function_id(target))
+        if source_position < 0 or target_position < 0:
+            return False
+
+        return self._graph.can_reach(source_position, target_position)
+
+    def feedback_loops(self,
+                       aspects: Iterable[str] | None = None
+                       ) -> tuple[list[np.ndarray], np.ndarray, pd.DataFrame]:
+        """
+        Find the feedback loops of the FRAM model.
+
+        A feedback loop is a set of functions that all influence each other
+        through their connections: a strongly connected component of more
+        than one function, or a function connected to itself. Components are
+        found in time linear in the size of the model, without recursion, so
+        this scales to very large models.
+
+        Parameters
+        ----------
+        aspects : Iterable[str], optional
+            Only follow connections that end at these aspects, from
+            {'I', 'P', 'R', 'C', 'T'}. If None, all connections are followed.
+            Defaults to None.
 
-        function_times = {}  # {key=id, value=name}
+        Returns
+        -------
+        list[np.ndarray]
+            The function IDs of each feedback loop.
+        np.ndarray
+            The component of each function, in the order of get_functions().
+            Functions not in a feedback loop are components of their own.
+        pd.DataFrame
+            The condensed graph, with one row per pair of connected
+            components. The 'fromComponent' and 'toComponent' columns are
+            the component numbers and 'connections' the number of connections
+            between them. Components are numbered in topological order, so
+            every row leads from a lower to a higher numbered component.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> loops, components, dag = fram.feedback_loops()
+        >>> loops
+        [array([0, 1])]
+        """
+
+        graph = self._graph
+        labels, n_components = graph.components(aspects)
+
+        keep = graph.edge_mask(aspects)
+        from_c = labels[graph.src[keep]]
+        to_c = labels[graph.dst[keep]]
+
+        # A component is a loop if it has a connection within it
+        internal = from_c == to_c
+        cyclic = np.zeros(n_components, dtype=bool)
+        cyclic[from_c[internal]] = True
+
+        order = np.argsort(labels, kind='stable')
+        offsets = np.searchsorted(labels[order], np.arange(n_components + 1))
+        loops = [graph.ids[order[offsets[c]:offsets[c + 1]]]
+                 for c in np.flatnonzero(cyclic)]
+
+        pairs, counts = np.unique(from_c[~internal] * n_components
+                                  + to_c[~internal], return_counts=True)
+        dag = pd.DataFrame({'fromComponent': pairs // n_components,
+                            'toComponent': pairs % n_components,
+                            'connections': counts})
+
+        return loops, labels, dag
+
+    def centrality(self,
+                   kind: str = "degree",
+                   aspects: Iterable[str] | None = None,
+                   samples: int | None = None,
+                   damping: float = 0.85,
+                   seed: int | None = None) -> pd.DataFrame:
+        """
+        Rank the functions of the FRAM model by centrality.
+
+        Central functions are those through which variability is most likely
+        to propagate. All measures are computed with NumPy over the adjacency
+        index of the model, so they can be recomputed interactively on large
+        models.
+
+        Parameters
+        ----------
+        kind : {'degree', 'pagerank', 'betweenness', 'eigenvector'}
+            The centrality measure. 'degree' counts the connections into and
+            out of each function, per aspect. 'pagerank' and 'eigenvector'
+            weight each function by the centrality of the functions that
+            connect to it. 'betweenness' is the normalized fraction of
+            shortest paths between other functions that pass through each
+            function. Defaults to 'degree'.
+        aspects : Iterable[str], optional
+            Only use connections that end at these aspects, from
+            {'I', 'P', 'R', 'C', 'T'}. If None, all connections are used.
+            Defaults to None.
+        samples : int, optional
+            For 'betweenness', estimate the centrality from the shortest paths
+            of this many randomly chosen source functions. If None, all
+            functions are used, for the exact centrality. Defaults to None.
+        damping : float, optional
+            The damping factor of 'pagerank'. Defaults to 0.85.
+        seed : int, optional
+            The random seed used to choose the sampled sources. Defaults to
+            None.
+
+        Returns
+        -------
+        pd.DataFrame
+            The centrality of each function, indexed by function ID. 'degree'
+            has the columns in_<aspect> and out_<aspect> for each aspect, and
+            the totals in and out. Other measures have a single column named
+            after the measure.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> fram.centrality('pagerank').nlargest(5, 'pagerank')
+        """
 
-        for index, row in self._connection_data.iterrows():
-            if row['toFn'] == id and row['toAspect'] == "T":
-                outputfn_name = self.get_function_name(row['outputFn'])
-                function_times.update({row['outputFn']: outputfn_name})
+        kind = kind.lower()
+        graph = self._graph
+        keep = graph.edge_mask(aspects)
+
+        if kind == 'degree':
+            result = _centrality.degree(graph, keep)
+        elif kind == 'pagerank':
+            result = pd.DataFrame({kind: _centrality.pagerank(graph, keep,
+                                                              damping)})
+        elif kind == 'eigenvector':
+            result = pd.DataFrame({kind: _centrality.eigenvector(graph,
+                                                                 keep)})
+        elif kind == 'betweenness':
+            sources = None
+            if samples is not None and samples < graph.number_of_functions:
+                rng = np.random.default_rng(seed)
+                sources = rng.choice(graph.number_of_functions, samples,
+                                     replace=False)
+            result = pd.DataFrame({kind: _centrality.betweenness(graph, keep,
+                                                                 sources)})
+        else:
+            raise ValueError("kind must be 'degree', 'pagerank', "
+                             "'betweenness' or 'eigenvector'.")
+
+        result.index = pd.Index(graph.ids, name='IDNr')
+        return result
 
-        return function_times
+    def _connection_weights(self,
+                            weight: str | dict | Iterable[float] | None
+                            ) -> np.ndarray | None:
+        """
+        Return the weight of each connection, in connection table order.
+
+        The weight is given as the name of a numeric connection column, a
+        dict keyed by raw connection name (as returned by
+        _count_data_connections), or one value per connection.
+        """
+
+        if weight is None:
+            return None
+
+        connection_data = self._connection_data
+        if isinstance(weight, str):
+            if not pd.api.types.is_numeric_dtype(connection_data[weight]):
+                raise ValueError("The weight column must be numeric.")
+            return connection_data[weight].to_numpy()
+        if isinstance(weight, dict):
+            return connection_data['Name'].map(weight).fillna(0.0).to_numpy(
+                dtype=np.float64)
+
+        weights = np.asarray(weight if isinstance(weight, (np.ndarray,
+                                                           pd.Series))
+                             else list(weight))
+        if weights.shape != (len(connection_data),):
+            raise ValueError("One weight is required per connection.")
+        return weights
+
+    def to_sparse(self,
+                  aspects: Iterable[str] | None = None,
+                  weight: str | dict | Iterable[float] | None = None
+                  ) -> tuple[Any, pd.Index]:
+        """
+        Return the adjacency matrix of the FRAM model as a sparse matrix.
+
+        Row i and column j are the functions at positions i and j of the
+        returned index. Entry (i, j) counts the connections from the output
+        of function i to function j, or sums their weights. The matrix is
+        built directly from the integer arrays of the adjacency index, with
+        no Python loop over the connections. This requires the scipy package.
+
+        Parameters
+        ----------
+        aspects : Iterable[str], optional
+            Only include connections that end at these aspects, from
+            {'I', 'P', 'R', 'C', 'T'}. If None, all connections are included.
+            Defaults to None.
+        weight : str | dict | Iterable[float], optional
+            The weight of each connection: the name of a numeric connection
+            column, a dict keyed by raw connection name, or one value per
+            connection. If None, connections are counted. Defaults to None.
+
+        Returns
+        -------
+        scipy.sparse.csr_array
+            The (functions, functions) adjacency matrix.
+        pd.Index
+            The function ID of each row and column. Use get_indexer to map
+            function IDs to positions.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> matrix, ids = fram.to_sparse(aspects=['I'])
+        >>> matrix[ids.get_loc(0), ids.get_loc(1)]
+        1
+        """
+
+        try:
+            from scipy.sparse import csr_array
+        except ImportError:
+            raise ImportError("Sparse adjacency matrices require the scipy "
+                              "package.")
+
+        graph = self._graph
+        n = graph.number_of_functions
+        indptr, indices, data = graph.adjacency(
+            graph.edge_mask(aspects), self._connection_weights(weight))
+
+        matrix = csr_array((data, indices, indptr), shape=(n, n), copy=False)
+        return matrix, pd.Index(graph.ids, name='IDNr')
+
+    def to_networkx(self,
+                    aspects: Iterable[str] | None = None,
+                    weight: str | dict | Iterable[float] | None = None
+                    ) -> Any:
+        """
+        Export the FRAM model to a NetworkX graph.
+
+        Each function is a node, keyed by function ID, with its name as the
+        'name' attribute. Each connection is an edge from the function whose
+        output it starts at, with the 'aspect' it ends at and its 'name' as
+        attributes. This requires the networkx package.
+
+        Parameters
+        ----------
+        aspects : Iterable[str], optional
+            Only include connections that end at these aspects, from
+            {'I', 'P', 'R', 'C', 'T'}. If None, all connections are included.
+            Defaults to None.
+        weight : str | dict | Iterable[float], optional
+            If given, the weight of each connection is added as the 'weight'
+            edge attribute. See to_sparse. Defaults to None.
+
+        Returns
+        -------
+        networkx.MultiDiGraph
+            The FRAM model as a directed multigraph.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>> import networkx as nx
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> nx.shortest_path(fram.to_networkx(), 0, 4)
+        """
+
+        try:
+            import networkx as nx
+        except ImportError:
+            raise ImportError("Exporting to NetworkX requires the networkx "
+                              "package.")
+
+        graph = self._graph
+        edges = np.flatnonzero(graph.edge_mask(aspects))
+
+        attributes = pd.DataFrame({
+            'aspect': self._connection_data['toAspect'].to_numpy()[edges],
+            'name': self._connection_data['parsed_name'].to_numpy()[edges]})
+        weights = self._connection_weights(weight)
+        if weights is not None:
+            attributes['weight'] = weights[edges]
+
+        G = nx.MultiDiGraph()
+        G.add_nodes_from((id, {'name': name})
+                         for id, name in self.functions_by_id.items())
+        G.add_edges_from(zip(graph.ids[graph.src[edges]].tolist(),
+                             graph.ids[graph.dst[edges]].tolist(),
+                             attributes.to_dict('records')))
+
+        return G
 
     def visualize(self,
                   ax: Axes | None = None) -> Axes:
@@ -536,7 +1177,8 @@ class FRAM:
         return self.visualizer.render_path_from_function(self._function_data,
                                                          self._connection_data,
                                                          functionID,
-                                                         ax=ax)
+                                                         ax=ax,
+                                                         graph=self._graph)
 
     def _count_data_connections(self,
                                 data: pd.DataFrame,
@@ -561,49 +1203,341 @@ class FRAM:
         Returns
         -------
         dict
-            The number of times each connection is present in the data.
+            The fraction of observations in which each connection is present.
+        """
+
+        # The needed columns are packed into bits once. The count of each
+        # connection is then a population count over its columns.
+        counter = self._connection_counter(column_type)
+        counter.add(data)
+
+        return self._frequencies(counter)
+
+    def _connection_counter(self,
+                            column_type: str) -> ConnectionCounter:
         """
-        connections = {}
+        Return an empty counter of the connections in observations.
 
-        for index, row in self._connection_data.iterrows():
-            connections.update({row.Name: 0.0})
+        For 'functions' data, a connection is present when the columns of
+        both of its functions are. For 'connections' data, each connection
+        has its own column.
+        """
 
         column_type = column_type.lower()
-        # If the dataframe uses function names for the column names.
+        connection_data = self._connection_data
+
         if column_type == "functions":
-            for connection_default in connections:
-                # Splits connection to get information
-                connection = connection_default.split("|")
+            ends = [connection_data['outputFn'], connection_data['toFn']]
+            names = [ids.map(self.functions_by_id) for ids in ends]
+        elif column_type == "connections":
+            names = [connection_data['Name']]
+        else:
+            raise ValueError("column_type must be 'functions' or "
+                             "'connections'.")
 
-                # Get output and input function ID's
-                outputFn = int(connection[0])
-                toFn = int(connection[2])
+        columns = pd.unique(pd.concat(names, ignore_index=True))
+        index = pd.Index(columns)
+        positions = [index.get_indexer(pd.Index(n)) for n in names]
 
-                # Stores the names of the functions.
-                outputFn_name = self.functions_by_id.get(outputFn)
-                toFn_name = self.functions_by_id.get(toFn)
+        return ConnectionCounter(columns.tolist(), positions[0],
+                                 positions[1] if len(positions) > 1 else None)
 
-                # Finds all instances where both column values are 1
-                connection_value = len(data[(data[outputFn_name] == 1) &
-                                            (data[toFn_name] == 1)])
+    def _frequencies(self,
+                     counter: ConnectionCounter) -> dict:
+        """
+        Return the fraction of observations containing each connection.
 
-                # Updates the number of times this path is traversed.
-                connections.update({connection_default: connection_value})
+        The result is keyed by raw connection name, for Visualizer.render.
+        """
 
-        # If the dataframe uses connection_names for the column names.
-        elif column_type == "connections":
-            for connection_name in connections:
-                connection_value = len(data[(data[connection_name] == 1)])
-                connections.update({connection_name: connection_value})
+        return dict(zip(self._connection_data['Name'].tolist(),
+                        counter.frequencies().tolist()))
 
-        # Normalize connections
-        for key, value in connections.items():
-            connections[key] = value / len(data)
+    def count_connections(self,
+                          source: ObservationSource,
+                          column_type: str = "functions",
+                          chunksize: int = CHUNK_ROWS,
+                          workers: int | None = 1) -> dict:
+        """
+        Count the connections present in a set of observations.
+
+        The observations are "real" data of the system modeled by the FRAM,
+        as for highlight_data. They may be given in chunks, or as a file that
+        is read in chunks, so observation sets larger than memory can be
+        counted. Only the columns used by the model's connections are read.
+
+        Parameters
+        ----------
+        source : ObservationSource
+            The observations: a DataFrame, which may have sparse columns, an
+            ObservationMatrix of boolean, uint8 or bit-packed values, an
+            iterable of chunks of either with the same columns, the path of a
+            CSV file, optionally compressed, or the path of a Parquet file or
+            directory of Parquet files. Parquet row groups whose statistics
+            show a column is never 1 are not read for that column. A
+            directory written by observations.save_observations is
+            memory-mapped rather than read, which is fastest when the same
+            observations are counted repeatedly.
+        column_type : {'functions', 'connections'}
+            Whether the columns of the data represent functions or connections.
+            Defaults to 'functions'.
+        chunksize : int, optional
+            The number of rows counted at a time. Defaults to 100,000.
+        workers : int, optional
+            The number of worker processes that count chunks in parallel. The
+            result is identical to counting in the current process. If None,
+            one worker per CPU is used. Defaults to 1, for no worker
+            processes.
+
+        Returns
+        -------
+        dict
+            The fraction of observations in which each connection is present,
+            keyed by raw connection name. This can be passed to
+            highlight_data in place of the observations.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> frequencies = fram.count_connections('observations.csv.gz')
+        >>> fram.highlight_data(frequencies)
+        """
+
+        counter = self._connection_counter(column_type)
+
+        if workers == 1:
+            for chunk in iter_observations(source, counter.columns,
+                                           chunksize):
+                counter.add(chunk)
+        else:
+            count_parallel(counter, source, workers, chunksize)
+
+        return self._frequencies(counter)
+
+    def connection_frequencies_over_time(self,
+                                         data: pd.DataFrame,
+                                         time_column: str,
+                                         window: Any,
+                                         step: Any = None,
+                                         column_type: str = "functions"
+                                         ) -> pd.DataFrame:
+        """
+        Count the connections present in sliding windows of time.
+
+        The observations are as for highlight_data, with a column giving the
+        time of each observation. Windows of the given length start at the
+        earliest time and every step after it, up to the latest time. Each
+        window is counted from the last one by adding the observations that
+        entered it and subtracting those that left, so each observation is
+        counted at most twice however much the windows overlap.
 
-        return connections
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The observations, one per row, in any order.
+        time_column : str
+            The column holding the time of each observation. This may hold
+            datetimes or numbers.
+        window : Any
+            The length of each window: a pd.Timedelta, or a string such as
+            '1h', for datetimes, or a number.
+        step : Any, optional
+            The time between the start of one window and the next. Defaults
+            to the window length, for windows that do not overlap.
+        column_type : {'functions', 'connections'}
+            Whether the columns of the data represent functions or connections.
+            Defaults to 'functions'.
+
+        Returns
+        -------
+        pd.DataFrame
+            The fraction of the observations in each window in which each
+            connection is present. The index holds the half-open interval of
+            each window, and the columns are the raw connection names, so a
+            row converted with to_dict can be passed to highlight_data. It is
+            NaN for windows with no observations.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> frequencies = fram.connection_frequencies_over_time(
+        ...     data, 'timestamp', window='1D', step='1h')
+        >>> for ax in fram.highlight_over_time(frequencies):
+        ...     ax.figure.savefig(f'frame-{ax.get_title()}.png')
+        """
+
+        if step is None:
+            step = window
+
+        times = data[time_column]
+        if times.isna().any():
+            raise ValueError(f"The {time_column} column has missing times.")
+        zero: Any = 0
+        if (pd.api.types.is_datetime64_any_dtype(times)
+                or pd.api.types.is_timedelta64_dtype(times)):
+            window, step = pd.Timedelta(window), pd.Timedelta(step)
+            zero = pd.Timedelta(0)
+        if window <= zero or step <= zero:
+            raise ValueError("The window and step must be positive.")
+
+        order = None
+        if not times.is_monotonic_increasing:
+            order = np.argsort(times.to_numpy(), kind='stable')
+            times = times.iloc[order]
+        times = pd.Index(times)
+
+        counter = self._connection_counter(column_type)
+        names = self._connection_data['Name'].tolist()
+
+        # The needed columns are converted once, in time order, so each
+        # window only packs the rows that enter or leave it
+        present = np.empty((len(data), len(counter.columns)), dtype=bool,
+                           order='F')
+        for j, column in enumerate(counter.columns):
+            values = data[column].to_numpy()
+            present[:, j] = (values if order is None else values[order]) == 1
+        observed = ObservationMatrix(present, counter.columns)
+
+        if len(times) == 0:
+            return pd.DataFrame(columns=names, dtype=np.float64,
+                                index=pd.IntervalIndex([], closed='left'))
+
+        n_windows = int((times[-1] - times[0]) // step) + 1
+        starts = pd.Index(times[0] + step * np.arange(n_windows))
+        first = times.searchsorted(starts, side='left')
+        last = times.searchsorted(starts + window, side='left')
+
+        counts = np.empty((n_windows, len(names)), dtype=np.int64)
+        observations = np.empty(n_windows, dtype=np.int64)
+        lo = hi = 0
+        for k, (start, stop) in enumerate(zip(first, last)):
+            # Rows that left the window, then rows that entered it
+            if lo < min(start, hi):
+                counter.subtract(observed[lo:min(start, hi)])
+            if max(start, hi) < stop:
+                counter.add(observed[max(start, hi):stop])
+            lo, hi = start, stop
+
+            counts[k] = counter.counts
+            observations[k] = counter.observations
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frequencies = counts / observations[:, np.newaxis]
+
+        index = pd.IntervalIndex.from_arrays(starts, starts + window,
+                                             closed='left')
+        return pd.DataFrame(frequencies, index=index, columns=names)
+
+    def conformance(self,
+                    events: EventSource,
+                    case_column: str = 'case_id',
+                    function_column: str = 'function',
+                    time_column: str | None = 'timestamp',
+                    chunksize: int = CHUNK_ROWS
+                    ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """
+        Compare the transitions in an event log with the model's connections.
+
+        Each time an event of one function directly follows an event of
+        another in the same case, the log shows a transition between them.
+        Transitions are counted as integer keys of function pairs, in one
+        pass over the log, and joined with the connections of the model on
+        the same keys. A transition matches every connection from the output
+        of its first function to its second function.
+
+        Parameters
+        ----------
+        events : EventSource
+            The event log: a DataFrame with one event per row, an iterable of
+            chunks of one, the path of a CSV file, optionally compressed, or
+            the path of a Parquet file or directory of Parquet files. The
+            events of a case in different chunks must be in time order.
+        case_column : str, optional
+            The column identifying the case of each event. Defaults to
+            'case_id'.
+        function_column : str, optional
+            The column holding the name of the function of each event.
+            Defaults to 'function'.
+        time_column : str, optional
+            The column ordering the events of each case. If None, events are
+            taken to be in order. Defaults to 'timestamp'.
+        chunksize : int, optional
+            The number of events read at a time. Defaults to 100,000.
+
+        Returns
+        -------
+        pd.DataFrame
+            The connections that were observed, as in get_connections, with
+            the number of transitions observed in a 'count' column.
+        pd.DataFrame
+            The connections that were never observed, as in get_connections.
+        pd.DataFrame
+            The transitions with no connection in the model, with the
+            function IDs in the 'fromFn' and 'toFn' columns and the number of
+            times observed in a 'count' column, most frequent first. This
+            includes the transitions into and out of functions of the log
+            that are not in the model, which are given by their name in the
+            log in place of an ID.
+
+        Examples
+        --------
+        >>> import framalytics
+        >>>
+        >>> fram = framalytics.FRAM('my-fram-model.xfmv')
+        >>> matched, unobserved, unmodelled = fram.conformance('events.csv')
+        """
+
+        graph = self._graph
+        n = graph.number_of_functions
+        names = [self.functions_by_id[id] for id in graph.ids.tolist()]
+
+        observed, observed_names = directly_follows(events, names,
+                                                    case_column,
+                                                    function_column,
+                                                    time_column, chunksize)
+        observed_from = observed['from'].to_numpy(dtype=np.int64)
+        observed_to = observed['to'].to_numpy(dtype=np.int64)
+        observed_counts = observed['count'].to_numpy(dtype=np.int64)
+
+        # Pairs are keyed the same way on both sides, in 64 bits so that the
+        # narrow integer IDs of small models cannot overflow. Functions not
+        # in the model are numbered from n, so their keys match no
+        # connection. Connections to or from unknown IDs match nothing.
+        observed_keys = observed_from * len(observed_names) + observed_to
+        model_keys = np.where(graph.known,
+                              graph.src.astype(np.int64)
+                              * len(observed_names) + graph.dst, -1)
+
+        found = pd.Index(observed_keys).get_indexer(model_keys)
+        counts = np.zeros(len(model_keys), dtype=np.int64)
+        hit = found >= 0
+        counts[hit] = observed_counts[found[hit]]
+
+        connections = self.get_connections().assign(count=counts)
+        matched = connections[counts > 0]
+        unobserved = connections[counts == 0].drop(columns='count')
+
+        # Functions are named by ID, or by name if not in the model
+        labels = pd.Index(graph.ids)
+        if len(observed_names) > n:
+            labels = labels.append(observed_names[n:])
+        unmodelled = ~np.isin(observed_keys, model_keys)
+        transitions = pd.DataFrame({
+            'fromFn': labels[observed_from[unmodelled]],
+            'toFn': labels[observed_to[unmodelled]],
+            'count': observed_counts[unmodelled]})
+        transitions = transitions.sort_values('count', ascending=False,
+                                              kind='stable',
+                                              ignore_index=True)
+
+        return matched, unobserved, transitions
 
     def highlight_data(self,
-                       data: pd.DataFrame,
+                       data: ObservationSource | dict,
                        column_type: str = "functions",
                        appearance: str = "pure",
                        ax: Axes | None = None) -> Axes:
@@ -630,8 +1564,11 @@ class FRAM:
 
         Paramters
         ---------
-        data : pd.DataFrame
-            A DataFrame containing the observations.
+        data : ObservationSource | dict
+            A DataFrame containing the observations, or any other source of
+            observations accepted by count_connections. The dict returned by
+            count_connections may be given instead, to highlight counts that
+            were already made.
         column_type : {'functions', 'connections'}
             Whether the columns of the data represent functions or connections.
             Defaults to 'functions'.
@@ -672,11 +1609,63 @@ class FRAM:
 
         # Makes new figure without the Bezier curves being produced.
 
-        connections = self._count_data_connections(data=data,
-                                                   column_type=column_type)
+        if isinstance(data, dict):
+            connections = data
+        else:
+            connections = self.count_connections(data,
+                                                 column_type=column_type)
 
         return self.visualizer.render(self._function_data,
                                       self._connection_data,
                                       real_connections=connections,
                                       appearance=appearance,
                                       ax=ax)
+
+    def highlight_over_time(self,
+                            frequencies: pd.DataFrame,
+                            appearance: str = "pure",
+                            ax: Axes | None = None) -> Iterator[Axes]:
+        """
+        Visualize the FRAM model once per window of time, highlighting the
+        connections present in each window.
+
+        The frames are drawn one at a time onto the same Axes, which is
+        cleared between frames, so each frame should be saved or shown
+        before the next is drawn. Connections are coloured as in
+        highlight_data. The title of each frame is its window.
+
+        Parameters
+        ----------
+        frequencies : pd.DataFrame
+            The frequency of each connection in each window, as returned by
+            connection_frequencies_over_time.
+        appearance : {'pure', 'traced', 'expand'}
+            Select the visual representation of the connection highlight.
+            Defaults to 'pure'.
+        ax : Axes, optional
+            The Matplotlib Axes on which to render the frames. If None, then
+            a new Matplotlib Axes will be created. Defaults to None.
+
+        Yields
+        ------
+        Axes
+            The Matplotlib Axes, once each frame is rendered onto it.
+
+        Examples
+        --------
+        >>> frequencies = fram.connection_frequencies_over_time(
+        ...     data, 'timestamp', window='1D')
+        >>> for k, ax in enumerate(fram.highlight_over_time(frequencies)):
+        ...     ax.figure.savefig(f'frame-{k:03d}.png')
+        """
+
+        for window, row in frequencies.iterrows():
+            connections = row.to_dict()
+            if ax is None:
+                ax = self.highlight_data(connections, appearance=appearance)
+            else:
+                ax.clear()
+                self.highlight_data(connections, appearance=appearance, ax=ax)
+
+            ax.set_title(str(window))
+            yield ax
@@ -0,0 +1,196 @@
+import os
+from contextlib import nullcontext
+from typing import TextIO
+
+import numpy as np
+
+from .xfmv_parser import (ASPECT_TAGS, create_bezier_curves, format_curves)
+
+# Horizontal and vertical spacing between functions, in FMV units.
+LAYER_SPACING = 220
+ROW_SPACING = 160
+
+# Border colours, as the 24-bit integers stored by the FMV.
+COLORS = [108251, 16711680, 65280, 255, 16753920, 8388736]
+
+# Relative frequency of the aspect a connection ends at.
+DEFAULT_ASPECTS = {'I': 0.5, 'P': 0.15, 'R': 0.15, 'C': 0.1, 'T': 0.1}
+
+
+def _layout(n_functions: int,
+            rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray,
+                                               np.ndarray]:
+    """
+    Place functions in layers running left to right, like a process flow.
+
+    Returns the layer of each function and its x and y coordinates.
+    """
+
+    per_layer = max(1, int(np.sqrt(n_functions / 2)))
+    layer = np.arange(n_functions) // per_layer
+    row = np.arange(n_functions) % per_layer
+
+    x = 100 + layer * LAYER_SPACING + rng.uniform(-30, 30, n_functions)
+    y = 80 + row * ROW_SPACING + rng.uniform(-25, 25, n_functions)
+
+    # Stagger alternate layers so connections are not all horizontal
+    y += (layer % 2) * ROW_SPACING / 2
+
+    return layer, np.round(x, 2), np.round(y, 2)
+
+
+def _connect(layer: np.ndarray,
+             n_connections: int,
+             feedback: float,
+             rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Choose the source and target function of each connection.
+
+    Most connections lead from one layer to one of the next two layers. A
+    fraction, given by feedback, connect arbitrary functions.
+    """
+
+    n_functions = len(layer)
+    per_layer = int(np.sum(layer == 0))
+    n_layers = int(layer[-1]) + 1
+
+    from_fn = rng.integers(0, n_functions, n_connections)
+
+    # Forward connections to a random function one or two layers on
+    to_layer = layer[from_fn] + rng.integers(1, 3, n_connections)
+    to_layer = np.minimum(to_layer, n_layers - 1)
+    to_fn = to_layer * per_layer + rng.integers(0, per_layer, n_connections)
+    to_fn = np.minimum(to_fn, n_functions - 1)
+
+    random = rng.random(n_connections) < feedback
+    to_fn[random] = rng.integers(0, n_functions, int(random.sum()))
+
+    # No function connects to itself
+    self_loop = to_fn == from_fn
+    to_fn[self_loop] = (to_fn[self_loop] + 1) % n_functions
+
+    return from_fn, to_fn
+
+
+def generate_xfmv(filename: str | os.PathLike | TextIO,
+                  n_functions: int,
+                  n_connections: int | None = None,
+                  aspects: dict[str, float] | None = None,
+                  colored: float = 0.1,
+                  synthesized: bool = False,
+                  feedback: float = 0.05,
+                  seed: int | None = None) -> None:
+    """
+    Write a synthetic FRAM model to an .xfmv file.
+
+    The functions are laid out in layers running left to right, and most
+    connections lead from one layer to the next, as in a typical process
+    model. This is intended for testing how the parser, queries and
+    rendering scale with model size.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike | TextIO
+        The .xfmv file to write, or an open text file.
+    n_functions : int
+        The number of functions.
+    n_connections : int, optional
+        The number of connections. Defaults to twice the number of functions.
+    aspects : dict, optional
+        The relative frequency of each aspect (I, P, R, C, T) that
+        connections end at. Defaults to mostly input connections.
+    colored : float, optional
+        The fraction of functions given a border colour. Defaults to 0.1.
+    synthesized : bool, optional
+        If True, no Aspect (connection) elements are written, so connections
+        must be synthesized from the aspects of each function when the file
+        is read. Defaults to False.
+    feedback : float, optional
+        The fraction of connections between arbitrary functions rather than
+        to the next layers. These create feedback loops. Defaults to 0.05.
+    seed : int, optional
+        The random seed. Defaults to None.
+
+    Examples
+    --------
+    >>> from framalytics.generator import generate_xfmv
+    >>>
+    >>> generate_xfmv('large-model.xfmv', n_functions=10000, seed=42)
+    """
+
+    if n_connections is None:
+        n_connections = 2 * n_functions
+    if aspects is None:
+        aspects = DEFAULT_ASPECTS
+
+    if n_functions < 1:
+        raise ValueError("A model requires at least one function.")
+    if n_functions < 2 and n_connections > 0:
+        raise ValueError("Connections require at least two functions.")
+    if set(aspects) - set(DEFAULT_ASPECTS):
+        raise ValueError("Connections can only end at the I, P, R, C or T "
+                         "aspects.")
+
+    rng = np.random.default_rng(seed)
+
+    layer, x, y = _layout(n_functions, rng)
+    function_type = rng.choice([0, 1, 2], n_functions, p=[0.6, 0.1, 0.3])
+    has_color = rng.random(n_functions) < colored
+    color = rng.choice(COLORS, n_functions)
+
+    from_fn, to_fn = _connect(layer, n_connections, feedback, rng)
+
+    aspect_names = list(aspects)
+    weights = np.array([aspects[a] for a in aspect_names], dtype=np.float64)
+    to_aspect = rng.choice(aspect_names, n_connections,
+                           p=weights / weights.sum())
+
+    with (open(filename, 'w', encoding='utf-8')
+          if isinstance(filename, (str, os.PathLike))
+          else nullcontext(filename)) as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        f.write('<FM Version="0,3,0,0">\n')
+
+        f.write('<Functions>\n')
+        f.writelines(
+            f'<Function fnStyle="0" x="{x[i]:.2f}" y="{y[i]:.2f}"'
+            + (f' style="custom" color="{color[i]}"' if has_color[i] else '')
+            + f'><IDNr>{i}</IDNr><FunctionType>{function_type[i]}'
+            f'</FunctionType><IDName>Function {i}</IDName>'
+            f'<Description>Synthetic function {i}</Description></Function>\n'
+            for i in range(n_functions))
+        f.write('</Functions>\n')
+
+        if not synthesized:
+            curves = create_bezier_curves(x[from_fn], y[from_fn],
+                                          np.full(n_connections, 'O'),
+                                          x[to_fn], y[to_fn], to_aspect)
+
+            f.write('<Aspects>\n')
+            strings = format_curves(curves, decimals=2)
+            f.writelines(
+                f'<Aspect x="0" y="0" directionX="from" directionY="to" '
+                f'outputFn="{a}" toFn="{b}"><Name>{a}|Aspect {k}|{b}|{c}'
+                f'</Name><Curve>{curve}</Curve></Aspect>\n'
+                for k, (a, b, c, curve) in enumerate(
+                    zip(from_fn, to_fn, to_aspect, strings)))
+            f.write('</Aspects>\n')
+
+        # One named aspect per connection, from the output of one function
+        # to an aspect of another.
+        for tag, char in ASPECT_TAGS.items():
+            if char == 'O':
+                ids = np.arange(n_connections)
+                fns = from_fn
+            else:
+                ids = np.flatnonzero(to_aspect == char)
+                fns = to_fn[ids]
+
+            f.write(f'<{tag}s>\n')
+            f.writelines(
+                f'<{tag}><IDNr>{k}</IDNr><FunctionIDNr>{fn}</FunctionIDNr>'
+                f'<IDName>Aspect {k}</IDName></{tag}>\n'
+                for k, fn in zip(ids, fns))
+            f.write(f'</{tag}s>\n')
+
+        f.write('</FM>\n')
@@ -0,0 +1,494 @@
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from .xfmv_parser import ASPECTS
+
+
+def _csr(keys: np.ndarray,
+         n_keys: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Group edges by an integer key in compressed sparse row (CSR) form.
+
+    Returns the offsets, of length n_keys + 1, and the edge indices ordered
+    by key. The edges of key k are edges[offsets[k]:offsets[k + 1]]. Edges
+    with the same key keep their original order.
+    """
+
+    edges = np.argsort(keys, kind='stable')
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+
+    return offsets, edges
+
+
+def _gather(offsets: np.ndarray,
+            edges: np.ndarray,
+            keys: np.ndarray) -> np.ndarray:
+    """
+    Concatenate the CSR edge lists of many keys.
+
+    Returns edges[offsets[k]:offsets[k + 1]] for each k in keys, joined in
+    order, without a Python loop over the keys.
+    """
+
+    starts = offsets[keys]
+    lengths = offsets[keys + 1] - starts
+    total = int(lengths.sum())
+
+    # Each edge is its list start plus its rank within the list
+    shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return edges[shift + np.arange(total)]
+
+
+def _strongly_connected(offsets: np.ndarray,
+                        targets: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Label the strongly connected components of a graph in CSR form.
+
+    The successors of node v are targets[offsets[v]:offsets[v + 1]]. This is
+    Tarjan's algorithm, with an explicit stack in place of recursion so that
+    long paths do not hit the recursion limit.
+
+    Returns the component of each node and the number of components.
+    Components are numbered in reverse topological order: every edge between
+    two components leads to the lower numbered one.
+    """
+
+    n = len(offsets) - 1
+    offsets_ = offsets.tolist()
+    targets_ = targets.tolist()
+
+    index = [-1] * n
+    lowlink = [0] * n
+    labels = [-1] * n
+    on_stack = [False] * n
+    next_edge = offsets_[:n]
+
+    stack: list[int] = []
+    counter = 0
+    n_components = 0
+
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        path = [root]
+
+        while path:
+            v = path[-1]
+            i = next_edge[v]
+
+            if i < offsets_[v + 1]:
+                next_edge[v] = i + 1
+                w = targets_[i]
+                if index[w] < 0:
+                    index[w] = lowlink[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    path.append(w)
+                elif on_stack[w] and index[w] < lowlink[v]:
+                    lowlink[v] = index[w]
+                continue
+
+            # All successors of v are done
+            path.pop()
+            if path and lowlink[v] < lowlink[path[-1]]:
+                lowlink[path[-1]] = lowlink[v]
+
+            if lowlink[v] == index[v]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    labels[w] = n_components
+                    if w == v:
+                        break
+                n_components += 1
+
+    return np.array(labels, dtype=np.int64), n_components
+
+
+class GraphIndex:
+    """
+    Adjacency index of the connections of a FRAM model.
+
+    Functions are referred to by position, their row in the function table.
+    Outgoing edges are grouped by source function, and incoming edges by
+    destination function and aspect, so the neighbours of a function are
+    found in time proportional to its degree.
+    """
+
+    def __init__(self,
+                 function_data: pd.DataFrame,
+                 connection_data: pd.DataFrame):
+        """
+        Build the index from the parsed tables of a FRAM model.
+
+        Parameters
+        ----------
+        function_data : pd.DataFrame
+            The function data from the FRAM model.
+        connection_data : pd.DataFrame
+            The connection data from the FRAM model.
+        """
+
+        self.ids = function_data['IDNr'].to_numpy(dtype=np.int64)
+        self._id_index = pd.Index(self.ids)
+        self._position_by_id = dict(zip(self.ids.tolist(),
+                                        range(len(self.ids))))
+
+        # Connections to or from an unknown function ID have position -1 at
+        # that end. They are left out of the index, so they are never
+        # followed, rather than failing queries of other functions.
+        self.src = self.positions(connection_data['outputFn'])
+        self.dst = self.positions(connection_data['toFn'])
+        self.known = (self.src >= 0) & (self.dst >= 0)
+
+        aspect = pd.Categorical(connection_data['toAspect'],
+                                categories=ASPECTS)
+        self.aspect = np.asarray(aspect.codes, dtype=np.int64)
+        if (self.aspect < 0).any():
+            raise ValueError("Connection has an unknown aspect.")
+
+        n = self.number_of_functions
+        known = np.flatnonzero(self.known)
+        self.out_offsets, out_edges = _csr(self.src[known], n)
+        self.in_offsets, in_edges = _csr(self.dst[known] * len(ASPECTS)
+                                         + self.aspect[known],
+                                         n * len(ASPECTS))
+        self.out_edges = known[out_edges]
+        self.in_edges = known[in_edges]
+
+        # Packed reachability bitsets, computed on first use
+        self._closure: tuple[np.ndarray, np.ndarray] | None = None
+
+    @property
+    def number_of_functions(self) -> int:
+        return len(self.ids)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.src)
+
+    def positions(self,
+                  ids: pd.Series | np.ndarray | list) -> np.ndarray:
+        """
+        Convert function IDs to positions.
+
+        Parameters
+        ----------
+        ids : array-like
+            Function IDs.
+
+        Returns
+        -------
+        np.ndarray
+            The position of each function, or -1 for unknown IDs.
+        """
+
+        return self._id_index.get_indexer(np.asarray(ids, dtype=np.int64))
+
+    def position(self,
+                 id: int) -> int:
+        """ The position of a function ID, or -1 if it is unknown. """
+
+        return self._position_by_id.get(id, -1)
+
+    def out_edge_indices(self,
+                         position: int) -> np.ndarray:
+        """ The connection indices of the outgoing edges of a function. """
+
+        start, end = self.out_offsets[position:position + 2]
+        return self.out_edges[start:end]
+
+    def in_edge_indices(self,
+                        position: int,
+                        aspect: str | None = None) -> np.ndarray:
+        """
+        The connection indices of the incoming edges of a function.
+
+        Parameters
+        ----------
+        position : int
+            The position of the function.
+        aspect : {'I', 'T', 'C', 'P', 'R'}, optional
+            Only include edges to this aspect. If None, all incoming edges
+            are included.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the incoming connections.
+        """
+
+        key = position * len(ASPECTS)
+        if aspect is None:
+            start = self.in_offsets[key]
+            end = self.in_offsets[key + len(ASPECTS)]
+        else:
+            key += ASPECTS.index(aspect)
+            start, end = self.in_offsets[key:key + 2]
+
+        return self.in_edges[start:end]
+
+    def successors(self,
+                   position: int) -> np.ndarray:
+        """ The positions of the functions a function connects to. """
+
+        return self.dst[self.out_edge_indices(position)]
+
+    def predecessors(self,
+                     position: int,
+                     aspect: str | None = None) -> np.ndarray:
+        """ The positions of the functions that connect to a function. """
+
+        return self.src[self.in_edge_indices(position, aspect)]
+
+    def reachable(self,
+                  position: int,
+                  direction: str = 'out') -> np.ndarray:
+        """
+        Find the functions reachable from a function.
+
+        This is a breadth-first search over the adjacency index, expanding a
+        whole frontier at a time. Each function and edge is visited once.
+
+        Parameters
+        ----------
+        position : int
+            The position of the function to start from.
+        direction : {'out', 'in'}
+            If 'out', follow connections forwards, to the functions
+            downstream. If 'in', follow them backwards, to the functions
+            upstream. Defaults to 'out'.
+
+        Returns
+        -------
+        np.ndarray
+            A boolean mask over the positions of the reachable functions. The
+            starting function is only included if it lies on a cycle.
+        """
+
+        if direction == 'out':
+            offsets, edges, ends = self.out_offsets, self.out_edges, self.dst
+        elif direction == 'in':
+            # The incoming edges of a function are contiguous across aspects
+            offsets = self.in_offsets[::len(ASPECTS)]
+            edges, ends = self.in_edges, self.src
+        else:
+            raise ValueError("direction must be 'out' or 'in'.")
+
+        n = self.number_of_functions
+        seen = np.zeros(n, dtype=bool)
+        slot = np.empty(n, dtype=np.int64)
+        frontier = np.array([position], dtype=np.int64)
+
+        while len(frontier):
+            found = ends[_gather(offsets, edges, frontier)]
+            found = found[~seen[found]]
+
+            # Drop duplicates, keeping the last occurrence of each function
+            rank = np.arange(len(found))
+            slot[found] = rank
+            frontier = found[slot[found] == rank]
+
+            seen[frontier] = True
+
+        return seen
+
+    def edge_mask(self,
+                  aspects: Iterable[str] | None = None) -> np.ndarray:
+        """
+        A boolean mask of the connections that end at the given aspects.
+
+        Connections to or from an unknown function are never included.
+
+        Parameters
+        ----------
+        aspects : Iterable[str], optional
+            The aspects to include. If None, all connections are included.
+
+        Returns
+        -------
+        np.ndarray
+            A boolean mask over the connections.
+        """
+
+        if aspects is None:
+            return self.known.copy()
+
+        aspects = list(aspects)
+        if set(aspects) - set(ASPECTS):
+            raise ValueError("Aspects must be among I, P, R, C and T.")
+
+        return self.known & np.isin(self.aspect,
+                                    [ASPECTS.index(a) for a in aspects])
+
+    def components(self,
+                   aspects: Iterable[str] | None = None
+                   ) -> tuple[np.ndarray, int]:
+        """
+        Find the strongly connected components of the connections.
+
+        Two functions are in the same component if each can be reached from
+        the other, so every component of more than one function is a
+        feedback loop. This takes time linear in the size of the model.
+
+        Parameters
+        ----------
+        aspects : Iterable[str], optional
+            Only follow connections that end at these aspects. If None, all
+            connections are followed.
+
+        Returns
+        -------
+        np.ndarray
+            The component of each function, by position.
+        int
+            The number of components. Components are numbered in topological
+            order: every connection between two components leads to the
+            higher numbered one.
+        """
+
+        keep = self.edge_mask(aspects)
+        offsets, edges = _csr(self.src[keep], self.number_of_functions)
+        labels, n_components = _strongly_connected(offsets,
+                                                   self.dst[keep][edges])
+
+        return n_components - 1 - labels, n_components
+
+    def adjacency(self,
+                  keep: np.ndarray,
+                  weights: np.ndarray | None = None
+                  ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The adjacency matrix of the connections in CSR form.
+
+        Rows are source functions and columns destination functions, by
+        position. Repeated connections between two functions are summed into
+        one entry.
+
+        Parameters
+        ----------
+        keep : np.ndarray
+            A boolean mask of the connections to include.
+        weights : np.ndarray, optional
+            The weight of each connection. If None, each connection has
+            weight 1, so entries count the connections.
+
+        Returns
+        -------
+        np.ndarray
+            The row offsets (indptr), of length functions + 1.
+        np.ndarray
+            The column of each entry (indices), sorted within each row.
+        np.ndarray
+            The value of each entry (data).
+        """
+
+        n = self.number_of_functions
+        keys = self.src[keep] * n + self.dst[keep]
+        if weights is None:
+            values = np.ones(len(keys), dtype=np.int64)
+        else:
+            values = np.asarray(weights)[keep]
+
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+
+        # Sum each run of equal keys into one entry
+        first = np.flatnonzero(np.diff(keys, prepend=-1))
+        data = np.add.reduceat(values, first) if len(first) else values
+        rows, indices = np.divmod(keys[first], n)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+        return indptr, indices, data
+
+    def closure(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The transitive closure of the connections, as packed bitsets.
+
+        Functions in the same strongly connected component reach the same
+        functions, so one bitset is stored per component. Components are
+        processed in reverse topological order, each combining the bitsets
+        of the components it connects to. The result is cached.
+
+        Returns
+        -------
+        np.ndarray
+            The component of each function.
+        np.ndarray
+            A (components, ceil(functions / 8)) uint8 array. Bit j of row c,
+            in np.packbits order, is set if function j is reachable from
+            component c.
+        """
+
+        if self._closure is not None:
+            return self._closure
+
+        n = self.number_of_functions
+        labels, n_components = _strongly_connected(self.out_offsets,
+                                                   self.dst[self.out_edges])
+
+        members = np.zeros((n_components, (n + 7) // 8), dtype=np.uint8)
+        positions = np.arange(n)
+        np.bitwise_or.at(members, (labels, positions >> 3),
+                         (0x80 >> (positions & 7)).astype(np.uint8))
+
+        # Edges between components, grouped by source component. An edge
+        # within a component means its functions reach each other.
+        from_c = labels[self.src[self.known]]
+        to_c = labels[self.dst[self.known]]
+        internal = from_c == to_c
+        cyclic = np.zeros(n_components, dtype=bool)
+        cyclic[from_c[internal]] = True
+
+        offsets, edges = _csr(from_c[~internal], n_components)
+        successors = to_c[~internal][edges]
+
+        reach = np.zeros_like(members)
+        for c in range(n_components):
+            # Successors have lower numbers, so are already complete
+            after = successors[offsets[c]:offsets[c + 1]]
+            if len(after):
+                reach[c] = np.bitwise_or.reduce(reach[after] | members[after],
+                                                axis=0)
+            if cyclic[c]:
+                reach[c] |= members[c]
+
+        self._closure = (labels, reach)
+        return self._closure
+
+    def can_reach(self,
+                  source: int,
+                  target: int) -> bool:
+        """
+        Whether there is a path of connections from source to target.
+
+        Uses the transitive closure, which is computed on the first call.
+        Each query then takes constant time.
+
+        Parameters
+        ----------
+        source : int
+            The position of the function the path starts from.
+        target : int
+            The position of the function the path ends at.
+
+        Returns
+        -------
+        bool
+            True if target is reachable from source.
+        """
+
+        labels, reach = self.closure()
+        byte = reach[labels[source], target >> 3]
+        return bool(byte & (0x80 >> (target & 7)))
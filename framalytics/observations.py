@@ -0,0 +1,909 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, TypeAlias
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on the size of the temporary arrays used when counting, in
+# bytes.
+CHUNK_BYTES = 64 * 1024 * 1024
+
+# The number of rows read at a time from observation files.
+CHUNK_ROWS = 100_000
+
+# File extensions read as Parquet. Directories are read as Parquet datasets.
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+# The files of a directory of saved observations: the packed bits, and an
+# index of the columns and the number of rows in each block of bits.
+MATRIX_FILE = 'observations.bin'
+INDEX_FILE = 'observations.json'
+INDEX_VERSION = 1
+
+
+class ObservationMatrix:
+    """
+    A matrix of observations with named columns, held as NumPy arrays.
+
+    Each row is an observation and each column a function or connection. The
+    values are either a (rows, columns) boolean or uint8 array, in which a
+    function or connection is present if its value is 1, or bit-packed rows
+    as returned by np.packbits(values, axis=1), which take one bit per value.
+    """
+
+    def __init__(self,
+                 values: np.ndarray,
+                 columns: Iterable[str],
+                 packed: bool = False):
+        """
+        Initialize an observation matrix.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            A (rows, columns) array of values, or a (rows, ceil(columns / 8))
+            uint8 array of bit-packed rows if packed is True.
+        columns : Iterable[str]
+            The name of each column.
+        packed : bool, optional
+            Whether the rows of values are bit-packed. Defaults to False.
+        """
+
+        self.values = values
+        self.columns = pd.Index(columns)
+        self.packed = packed
+
+        width = (len(self.columns) + 7) // 8 if packed else len(self.columns)
+        if values.ndim != 2 or values.shape[1] != width:
+            raise ValueError("The values must have one row per observation "
+                             "and one value (or bit) per column.")
+        if packed and values.dtype != np.uint8:
+            raise ValueError("Packed values must be a uint8 array.")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self,
+                    rows: slice) -> 'ObservationMatrix':
+        """ The observations in a slice of rows, sharing the same values. """
+
+        matrix = ObservationMatrix(self.values[rows], self.columns,
+                                   packed=self.packed)
+        # Slices share the index, and so its hash table
+        matrix.columns = self.columns
+        return matrix
+
+    def present(self,
+                column: str) -> np.ndarray:
+        """ A boolean array of the observations in which column is present. """
+
+        j = self.columns.get_loc(column)
+        if self.packed:
+            return (self.values[:, j >> 3] & (0x80 >> (j & 7))) != 0
+
+        return self.values[:, j] == 1
+
+
+class PackedColumns:
+    """
+    A block of observations packed into bits column by column.
+
+    This is the layout returned by pack_observations: one row of bits per
+    column, so the connections can be counted directly from the bits. Blocks
+    read from saved observations are views of the memory-mapped file.
+    """
+
+    def __init__(self,
+                 bits: np.ndarray,
+                 columns: Iterable[str],
+                 rows: int,
+                 origin: tuple[str, int] | None = None):
+        """
+        Initialize a block of packed observations.
+
+        Parameters
+        ----------
+        bits : np.ndarray
+            A (columns, ceil(rows / 8)) uint8 array. Bit i of row c, in
+            np.packbits order, is set if column c is present in observation i.
+        columns : Iterable[str]
+            The name of each column.
+        rows : int
+            The number of observations.
+        origin : tuple[str, int], optional
+            The file and byte offset the bits are mapped from, if any, so
+            other processes can map the same bits.
+        """
+
+        self.bits = bits
+        self.columns = pd.Index(columns)
+        self.rows = rows
+        self.origin = origin
+
+        if (bits.dtype != np.uint8
+                or bits.shape != (len(self.columns), (rows + 7) // 8)):
+            raise ValueError("The bits must be a uint8 array with one row "
+                             "per column and one bit per observation.")
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def positions(self,
+                  columns: list[str]) -> np.ndarray:
+        """ The row of bits of each of the given columns. """
+
+        return _column_positions(self.columns, columns)
+
+
+# Observations given as a DataFrame, an observation matrix, a block of
+# packed columns, an iterable of chunks of these, or the path of a CSV file,
+# a Parquet file or directory, or a directory of saved observations.
+ObservationChunk: TypeAlias = pd.DataFrame | ObservationMatrix | PackedColumns
+ObservationSource: TypeAlias = (ObservationChunk | Iterable[ObservationChunk]
+                                | str | os.PathLike)
+
+
+def _pack_positions(positions: np.ndarray,
+                    n: int) -> np.ndarray:
+    """ Pack the sorted, unique positions of the set bits of n bits. """
+
+    # Positions are unique, so adding the bits of each byte sets them
+    weights = (0x80 >> (positions & 7)).astype(np.float64)
+    return np.bincount(positions >> 3, weights=weights,
+                       minlength=(n + 7) // 8).astype(np.uint8)
+
+
+def _pack_column(series: pd.Series) -> np.ndarray:
+    """
+    Pack the observations in which a column is present into bits.
+
+    Sparse columns are packed from the positions of their stored values,
+    without creating a dense array.
+    """
+
+    if not isinstance(series.dtype, pd.SparseDtype):
+        return np.packbits(series.to_numpy() == 1)
+
+    array = series.array
+    positions = array.sp_index.indices.astype(np.int64)
+    stored = np.asarray(array.sp_values) == 1
+
+    if array.fill_value == 1:
+        # Present everywhere except where a stored value is not 1
+        bits = ~_pack_positions(positions[~stored], len(series))
+        if len(series) % 8:
+            bits[-1] &= (0xFF << (8 - len(series) % 8)) & 0xFF
+        return bits
+
+    return _pack_positions(positions[stored], len(series))
+
+
+def _check_columns(data: ObservationChunk,
+                   columns: list[str]) -> None:
+    """ Raise a KeyError if any of the columns are missing from the data. """
+
+    missing = [column for column in columns if column not in data.columns]
+    if missing:
+        raise KeyError(f"The observations have no column for {missing}.")
+
+
+def _column_positions(index: pd.Index,
+                      columns: list[str]) -> np.ndarray:
+    """
+    The position of each column in an index of unique column names.
+
+    Raises a KeyError if any of the columns are missing.
+    """
+
+    positions = index.get_indexer(pd.Index(columns))
+    if (positions < 0).any():
+        missing = [column for column, position in zip(columns, positions)
+                   if position < 0]
+        raise KeyError(f"The observations have no column for {missing}.")
+
+    return positions
+
+
+def _present_bits(values: np.ndarray,
+                  positions: np.ndarray,
+                  packed: bool) -> np.ndarray:
+    """
+    Pack the given columns of a block of observation rows, column by column.
+
+    The values are laid out as in an ObservationMatrix. The result is laid
+    out as returned by pack_observations.
+    """
+
+    if packed:
+        masks = (0x80 >> (positions & 7)).astype(np.uint8)
+        present = (values[:, positions >> 3] & masks) != 0
+        return np.ascontiguousarray(np.packbits(present, axis=0).T)
+
+    # Rows of the transpose are columns, contiguous in Fortran order
+    return np.packbits(values.T[positions] == 1, axis=1)
+
+
+def pack_observations(data: ObservationChunk,
+                      columns: list[str]) -> np.ndarray:
+    """
+    Convert the given columns of a set of observations to packed bits.
+
+    A function or connection is present in an observation if its column is
+    exactly 1. Each column is packed into one row of bits, so a million
+    observations of a column take 125 kB. Sparse DataFrame columns and
+    observation matrices are packed without creating dense columns, and the
+    bits of packed columns are gathered without unpacking them.
+
+    Parameters
+    ----------
+    data : pd.DataFrame | ObservationMatrix | PackedColumns
+        The observations.
+    columns : list[str]
+        The columns to convert.
+
+    Returns
+    -------
+    np.ndarray
+        A (columns, ceil(observations / 8)) uint8 array. Bit i of row c, in
+        np.packbits order, is set if column c is present in observation i.
+    """
+
+    if isinstance(data, PackedColumns):
+        return data.bits[data.positions(columns)]
+
+    if isinstance(data, ObservationMatrix):
+        return _present_bits(data.values,
+                             _column_positions(data.columns, columns),
+                             data.packed)
+
+    _check_columns(data, columns)
+
+    packed = np.empty((len(columns), (len(data) + 7) // 8), dtype=np.uint8)
+    for i, column in enumerate(columns):
+        packed[i] = _pack_column(data[column])
+
+    return packed
+
+
+def _may_be_present(statistics: Any) -> bool:
+    """ Whether column statistics allow a value of exactly 1. """
+
+    if statistics is None or not statistics.has_min_max:
+        return True
+
+    try:
+        return bool(statistics.min <= 1 <= statistics.max)
+    except TypeError:
+        return True
+
+
+def parquet_files(path: str | os.PathLike) -> list[str]:
+    """
+    List the Parquet files of a path.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        A Parquet file, or a directory searched recursively for files with
+        one of the PARQUET_SUFFIXES.
+
+    Returns
+    -------
+    list[str]
+        The files, in sorted order.
+    """
+
+    if not os.path.isdir(path):
+        return [str(path)]
+
+    files = sorted(str(file) for file in Path(path).rglob('*')
+                   if file.suffix.lower() in PARQUET_SUFFIXES
+                   and file.is_file())
+    if not files:
+        raise FileNotFoundError(f"No Parquet files found in {path}.")
+
+    return files
+
+
+def _iter_parquet(path: str | os.PathLike,
+                  columns: list[str] | None,
+                  chunksize: int) -> Iterator[ObservationMatrix]:
+    """
+    Read the given columns of a Parquet file, or directory of files.
+
+    Row groups are streamed in batches of chunksize rows. Only the needed
+    columns are read, and a column is not read at all from row groups whose
+    statistics show it never has the value 1. A row group in which no needed
+    column can be present is not read, only counted. If columns is None,
+    every column of each file is read.
+    """
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet observations requires the pyarrow "
+                          "package.")
+
+    for file in parquet_files(path):
+        with pq.ParquetFile(file) as reader:
+            metadata = reader.metadata
+            names = reader.schema_arrow.names
+            if columns is None:
+                columns = names
+            missing = [column for column in columns if column not in names]
+            if missing:
+                raise KeyError(f"The observations have no column for "
+                               f"{missing}.")
+
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                statistics = {row_group.column(i).path_in_schema:
+                              row_group.column(i).statistics
+                              for i in range(row_group.num_columns)}
+                read = [column for column in columns
+                        if _may_be_present(statistics.get(column))]
+
+                if not read:
+                    rows = row_group.num_rows
+                    for start in range(0, rows, chunksize):
+                        n = min(chunksize, rows - start)
+                        absent = np.broadcast_to(np.zeros((1, len(columns)),
+                                                          dtype=bool),
+                                                 (n, len(columns)))
+                        yield ObservationMatrix(absent, columns)
+                    continue
+
+                positions = [columns.index(column) for column in read]
+                for batch in reader.iter_batches(batch_size=chunksize,
+                                                 row_groups=[group],
+                                                 columns=read):
+                    values = np.zeros((batch.num_rows, len(columns)),
+                                      dtype=bool, order='F')
+                    for j, array in zip(positions, batch.columns):
+                        values[:, j] = array.to_numpy(
+                            zero_copy_only=False) == 1
+                    yield ObservationMatrix(values, columns)
+
+
+def iter_observations(source: ObservationSource,
+                      columns: list[str] | None,
+                      chunksize: int = CHUNK_ROWS
+                      ) -> Iterator[ObservationChunk]:
+    """
+    Iterate over a source of observations in chunks.
+
+    Parameters
+    ----------
+    source : ObservationSource
+        A DataFrame, observation matrix or block of packed columns, an
+        iterable of chunks of these, the path of a CSV file, optionally
+        compressed, the path of a Parquet file or directory of Parquet files,
+        or a directory of observations written by save_observations.
+    columns : list[str] | None
+        The columns needed. Only these columns are read from CSV and Parquet
+        files. If None, all columns are read.
+    chunksize : int, optional
+        The number of rows in each chunk read from a CSV or Parquet file,
+        DataFrame or observation matrix. Saved observations are read in the
+        blocks they were written in.
+
+    Yields
+    ------
+    pd.DataFrame | ObservationMatrix | PackedColumns
+        Chunks of observations.
+    """
+
+    if isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize]
+    elif isinstance(source, ObservationMatrix):
+        for start in range(0, len(source), chunksize):
+            yield source[start:start + chunksize]
+    elif isinstance(source, PackedColumns):
+        yield source
+    elif isinstance(source, (str, os.PathLike)):
+        if os.path.isfile(os.path.join(source, INDEX_FILE)):
+            yield from MappedObservations(source)
+            return
+
+        if (os.path.isdir(source)
+                or Path(source).suffix.lower() in PARQUET_SUFFIXES):
+            yield from _iter_parquet(source, columns, chunksize)
+            return
+
+        with pd.read_csv(source, usecols=columns,
+                         chunksize=chunksize) as reader:
+            yield from reader
+    else:
+        yield from source
+
+
+class MappedObservations:
+    """
+    Observations saved by save_observations, mapped from disk.
+
+    The packed bits are memory-mapped read-only, so they are not loaded into
+    memory. Only the pages that are counted are read, and they are held in
+    the operating system's page cache, which is shared by every process that
+    maps the same file. Iterating yields the blocks of packed columns, which
+    are views of the mapped file.
+    """
+
+    def __init__(self,
+                 path: str | os.PathLike):
+        """
+        Map a directory of saved observations.
+
+        Parameters
+        ----------
+        path : str | os.PathLike
+            The directory written by save_observations.
+        """
+
+        self.path = Path(path)
+        with open(self.path / INDEX_FILE, encoding='utf-8') as f:
+            index = json.load(f)
+
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported saved observations version "
+                             f"{index.get('version')}.")
+
+        self.columns = pd.Index(index['columns'])
+        self.blocks = [int(rows) for rows in index['blocks']]
+
+        filename = self.path / MATRIX_FILE
+        size = sum(len(self.columns) * ((rows + 7) // 8)
+                   for rows in self.blocks)
+        if os.path.getsize(filename) != size:
+            raise ValueError(f"{filename} does not match its index.")
+
+        # A zero-length file cannot be mapped
+        self.bits = (np.memmap(filename, dtype=np.uint8, mode='r')
+                     if size else np.empty(0, dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return sum(self.blocks)
+
+    def __iter__(self) -> Iterator[PackedColumns]:
+        filename = str(self.path / MATRIX_FILE)
+        offset = 0
+        for rows in self.blocks:
+            shape = (len(self.columns), (rows + 7) // 8)
+            size = shape[0] * shape[1]
+            yield PackedColumns(self.bits[offset:offset + size].reshape(shape),
+                                self.columns, rows, origin=(filename, offset))
+            offset += size
+
+
+def save_observations(path: str | os.PathLike,
+                      source: ObservationSource,
+                      columns: list[str] | None = None,
+                      chunksize: int = CHUNK_ROWS) -> MappedObservations:
+    """
+    Save observations to disk as packed bits, to be memory-mapped.
+
+    The observations are read once, in chunks, and written as packed columns
+    with an index of the column names. Counting saved observations maps the
+    file rather than reading it, so they can be counted and highlighted
+    repeatedly, and by many processes at once, without loading them again.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        The directory to write. It is created if needed, and any saved
+        observations in it are replaced.
+    source : ObservationSource
+        The observations, in any form accepted by iter_observations.
+    columns : list[str], optional
+        The columns to save. If None, all columns are saved.
+    chunksize : int, optional
+        The number of rows read and written at a time. Defaults to 100,000.
+
+    Returns
+    -------
+    MappedObservations
+        The saved observations.
+
+    Examples
+    --------
+    >>> from framalytics.observations import save_observations
+    >>>
+    >>> save_observations('observations', 'observations.csv.gz')
+    >>> fram.highlight_data('observations')
+    """
+
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Written under temporary names, so readers never see a partial file
+    matrix = directory / (MATRIX_FILE + '.tmp')
+    blocks = []
+    with open(matrix, 'wb') as f:
+        for chunk in iter_observations(source, columns, chunksize):
+            if columns is None:
+                columns = chunk.columns.tolist()
+            pack_observations(chunk, columns).tofile(f)
+            blocks.append(len(chunk))
+
+    index = directory / (INDEX_FILE + '.tmp')
+    with open(index, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'columns': columns or [],
+                   'blocks': blocks}, f)
+
+    os.replace(matrix, directory / MATRIX_FILE)
+    os.replace(index, directory / INDEX_FILE)
+
+    return MappedObservations(directory)
+
+
+def count_packed(packed: np.ndarray,
+                 left: np.ndarray,
+                 right: np.ndarray | None = None) -> np.ndarray:
+    """
+    Count the observations in which columns, or pairs of columns, are present.
+
+    Counts are gathered for the requested columns only: the bits of each
+    pair are combined with a bitwise and, then counted with a population
+    count. The columns are processed in chunks to bound memory use.
+
+    Parameters
+    ----------
+    packed : np.ndarray
+        The packed observations, as returned by pack_observations.
+    left : np.ndarray
+        The packed rows to count.
+    right : np.ndarray, optional
+        If given, count the observations in which both left[k] and right[k]
+        are present.
+
+    Returns
+    -------
+    np.ndarray
+        The int64 count of each column or pair.
+    """
+
+    counts = np.zeros(len(left), dtype=np.int64)
+    chunk = max(1, CHUNK_BYTES // max(packed.shape[1], 1))
+
+    for start in range(0, len(left), chunk):
+        stop = start + chunk
+        bits = packed[left[start:stop]]
+        if right is not None:
+            bits &= packed[right[start:stop]]
+        counts[start:stop] = np.bitwise_count(bits).sum(axis=1)
+
+    return counts
+
+
+class ConnectionCounter:
+    """
+    Accumulates the number of observations containing each connection.
+
+    Observations are added in chunks, so any number of observations can be
+    counted in bounded memory.
+    """
+
+    def __init__(self,
+                 columns: list[str],
+                 left: np.ndarray,
+                 right: np.ndarray | None = None):
+        """
+        Initialize an empty counter.
+
+        Parameters
+        ----------
+        columns : list[str]
+            The observation columns needed to count the connections.
+        left : np.ndarray
+            The position in columns of each connection's column, or of the
+            column of the function at its output end.
+        right : np.ndarray, optional
+            The position in columns of the column of the function at the
+            input end of each connection, for observations of functions.
+        """
+
+        self.columns = columns
+        self.left = left
+        self.right = right
+
+        self.counts = np.zeros(len(left), dtype=np.int64)
+        self.observations = 0
+
+    def add(self,
+            data: ObservationChunk) -> None:
+        """ Count the connections in a chunk of observations. """
+
+        self.counts += self._count(data)
+        self.observations += len(data)
+
+    def subtract(self,
+                 data: ObservationChunk) -> None:
+        """
+        Remove a chunk of observations that was added before.
+
+        This updates the counts of a sliding window as it moves past old
+        observations, without counting the rest again.
+        """
+
+        self.counts -= self._count(data)
+        self.observations -= len(data)
+
+    def _count(self,
+               data: ObservationChunk) -> np.ndarray:
+        """ The count of each connection in a chunk of observations. """
+
+        if isinstance(data, PackedColumns):
+            # Counted in place, without gathering the needed columns first
+            left, right = self.positions(data)
+            return count_packed(data.bits, left, right)
+
+        packed = pack_observations(data, self.columns)
+        return count_packed(packed, self.left, self.right)
+
+    def positions(self,
+                  data: PackedColumns) -> tuple[np.ndarray,
+                                                np.ndarray | None]:
+        """ The rows of bits to count in a block of packed columns. """
+
+        positions = data.positions(self.columns)
+        return (positions[self.left],
+                None if self.right is None else positions[self.right])
+
+    def add_counts(self,
+                   counts: np.ndarray,
+                   observations: int) -> None:
+        """ Add counts that were made elsewhere, such as in a worker. """
+
+        self.counts += counts
+        self.observations += observations
+
+    def frequencies(self) -> np.ndarray:
+        """ The fraction of the observations containing each connection. """
+
+        if self.observations == 0:
+            raise ValueError("There are no observations to count.")
+
+        return self.counts / self.observations
+
+
+def _count_shared(name: str,
+                  shape: tuple[int, ...],
+                  dtype: np.dtype,
+                  order: Literal['C', 'F'],
+                  layout: str,
+                  positions: np.ndarray | None,
+                  rows: tuple[int, int],
+                  left: np.ndarray,
+                  right: np.ndarray | None) -> np.ndarray:
+    """
+    Count the connections in observations in shared memory.
+
+    The layout is 'bits' for columns already packed by pack_observations,
+    'values' for a (rows, columns) array of values, or 'packed' for
+    bit-packed rows. Values and packed rows are compared and packed here,
+    for the given rows and the columns at the given positions.
+    """
+
+    shared = SharedMemory(name=name)
+    try:
+        data = np.ndarray(shape, dtype=dtype, buffer=shared.buf, order=order)
+        if layout == 'bits':
+            counts = count_packed(data, left, right)
+        else:
+            assert positions is not None
+            bits = _present_bits(data[rows[0]:rows[1]], positions,
+                                 layout == 'packed')
+            counts = count_packed(bits, left, right)
+        del data
+    finally:
+        shared.close()
+
+    return counts
+
+
+def _count_mapped(filename: str,
+                  offset: int,
+                  shape: tuple[int, int],
+                  left: np.ndarray,
+                  right: np.ndarray | None) -> np.ndarray:
+    """ Count the connections in a block of a saved observations file. """
+
+    packed = np.memmap(filename, dtype=np.uint8, mode='r', offset=offset,
+                       shape=shape)
+    return count_packed(packed, left, right)
+
+
+def _numeric_dtype(data: pd.DataFrame,
+                   columns: list[str]) -> np.dtype | None:
+    """
+    The dtype holding all the given columns, or None if any is not a dense
+    NumPy number or boolean column.
+    """
+
+    dtypes = [data[column].dtype for column in columns]
+    numeric = [dtype for dtype in dtypes
+               if isinstance(dtype, np.dtype) and dtype.kind in 'biuf']
+    if len(numeric) < len(dtypes):
+        return None
+
+    return np.result_type(*numeric) if numeric else np.dtype(np.uint8)
+
+
+class _SharedBlocks:
+    """
+    Shared memory blocks for counting tasks, reused once a task is done.
+
+    Reusing blocks means chunks are copied into memory that is already
+    mapped, which is faster than mapping new blocks for every chunk.
+    """
+
+    def __init__(self) -> None:
+        self.free: list[SharedMemory] = []
+        self.used: list[SharedMemory] = []
+
+    def array(self,
+              shape: tuple[int, ...],
+              dtype: np.dtype,
+              order: Literal['C', 'F'] = 'C'
+              ) -> tuple[SharedMemory, np.ndarray]:
+        """ A block holding an array of the given shape, and the array. """
+
+        size = max(1, int(np.prod(shape)) * dtype.itemsize)
+        fits = [block for block in self.free if block.size >= size]
+        if fits:
+            shared = min(fits, key=lambda block: block.size)
+            self.free.remove(shared)
+        else:
+            shared = SharedMemory(create=True, size=size)
+        self.used.append(shared)
+
+        return shared, np.ndarray(shape, dtype=dtype, buffer=shared.buf,
+                                  order=order)
+
+    def done(self,
+             shared: SharedMemory) -> None:
+        """ Make a block available for reuse. """
+
+        self.used.remove(shared)
+        self.free.append(shared)
+
+    def close(self) -> None:
+        """ Free all the blocks. """
+
+        for shared in self.free + self.used:
+            shared.close()
+            shared.unlink()
+        self.free, self.used = [], []
+
+
+def _order(array: np.ndarray) -> Literal['C', 'F']:
+    """ The memory order in which an array is copied to shared memory. """
+
+    return 'F' if array.flags.f_contiguous and array.ndim > 1 else 'C'
+
+
+def count_parallel(counter: ConnectionCounter,
+                   source: ObservationSource,
+                   workers: int | None = None,
+                   chunksize: int = CHUNK_ROWS) -> None:
+    """
+    Count the connections in observations across processes.
+
+    The observations are placed in shared memory and the worker processes
+    compare, pack and count them, each mapping the shared memory without
+    copying it. An observation matrix is placed in shared memory once, and
+    each worker counts a range of its rows. For other sources, the needed
+    columns of each chunk are copied into shared memory as they are, except
+    sparse and non-numeric columns, which are packed into bits first. Blocks
+    of saved observations are not copied at all: the worker maps them from
+    the file. The integer counts are added to the counter, so the result is
+    identical to counting serially.
+
+    Parameters
+    ----------
+    counter : ConnectionCounter
+        The counter to add the counts to.
+    source : ObservationSource
+        The observations, in any form accepted by iter_observations.
+    workers : int, optional
+        The number of worker processes. If None, one worker per CPU is used.
+    chunksize : int, optional
+        The number of rows counted by each task. Defaults to 100,000.
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    blocks = _SharedBlocks()
+    pending: deque[tuple[Future, SharedMemory | None, int]] = deque()
+
+    def collect() -> None:
+        future, shared, observations = pending.popleft()
+        counter.add_counts(future.result(), observations)
+        if shared is not None:
+            blocks.done(shared)
+
+    def share(array: np.ndarray) -> SharedMemory:
+        shared, copy = blocks.array(array.shape, array.dtype, _order(array))
+        copy[...] = array
+        return shared
+
+    def tasks(executor: ProcessPoolExecutor
+              ) -> Iterator[tuple[Future, SharedMemory | None, int]]:
+        def submit(shared: SharedMemory,
+                   array: np.ndarray,
+                   layout: str,
+                   positions: np.ndarray | None,
+                   rows: tuple[int, int]) -> Future:
+            return executor.submit(_count_shared, shared.name, array.shape,
+                                   array.dtype, _order(array), layout,
+                                   positions, rows, counter.left,
+                                   counter.right)
+
+        if isinstance(source, ObservationMatrix):
+            # Shared once, and counted a range of rows at a time
+            positions = _column_positions(source.columns, counter.columns)
+            layout = 'packed' if source.packed else 'values'
+            shared = share(source.values)
+            for start in range(0, len(source), chunksize):
+                stop = min(start + chunksize, len(source))
+                yield (submit(shared, source.values, layout, positions,
+                              (start, stop)),
+                       None, stop - start)
+            return
+
+        for chunk in iter_observations(source, counter.columns, chunksize):
+            if isinstance(chunk, PackedColumns) and chunk.origin:
+                left, right = counter.positions(chunk)
+                yield (executor.submit(_count_mapped, *chunk.origin,
+                                       chunk.bits.shape, left, right),
+                       None, len(chunk))
+                continue
+
+            rows = (0, len(chunk))
+            dtype = None
+            if isinstance(chunk, pd.DataFrame):
+                _check_columns(chunk, counter.columns)
+                dtype = _numeric_dtype(chunk, counter.columns)
+
+            if isinstance(chunk, ObservationMatrix):
+                positions = _column_positions(chunk.columns, counter.columns)
+                shared = share(chunk.values)
+                future = submit(shared, chunk.values,
+                                'packed' if chunk.packed else 'values',
+                                positions, rows)
+            elif isinstance(chunk, pd.DataFrame) and dtype is not None:
+                # Each column is copied as it is, into Fortran order
+                shared, values = blocks.array(
+                    (len(chunk), len(counter.columns)), dtype, 'F')
+                for j, column in enumerate(counter.columns):
+                    values[:, j] = chunk[column].to_numpy()
+                future = submit(shared, values, 'values',
+                                np.arange(len(counter.columns)), rows)
+                del values
+            else:
+                packed = pack_observations(chunk, counter.columns)
+                shared = share(packed)
+                future = submit(shared, packed, 'bits', None, rows)
+            yield future, shared, len(chunk)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for task in tasks(executor):
+                pending.append(task)
+                # Bound the tasks in flight, and so the memory used
+                if len(pending) > 2 * workers:
+                    collect()
+
+            while pending:
+                collect()
+        finally:
+            for future, _, _ in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+            blocks.close()
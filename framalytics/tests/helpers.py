@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+
+from framalytics.graph import GraphIndex
+
+
+def make_graph(n_functions: int,
+               edges: list[tuple[int, int]],
+               aspect: str = 'I') -> GraphIndex:
+    """ Build a graph index directly from a list of (from, to) edges. """
+
+    function_data = pd.DataFrame({'IDNr': np.arange(n_functions)})
+    connection_data = pd.DataFrame({'outputFn': [a for a, _ in edges],
+                                    'toFn': [b for _, b in edges],
+                                    'toAspect': [aspect] * len(edges)})
+
+    return GraphIndex(function_data, connection_data)
@@ -0,0 +1,128 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+import pandas as pd
+import framalytics
+from framalytics import cache
+from framalytics.xfmv_parser import parse_xfmv
+
+
+@pytest.fixture
+def coloured_xfmv(tmp_path: Path) -> str:
+    file = Path(__file__).parent / 'resources/coloured_fram.xfmv'
+    copy = tmp_path / 'coloured_fram.xfmv'
+    shutil.copy(file, copy)
+    return str(copy)
+
+
+def test_cache_round_trip(coloured_xfmv: str, tmp_path: Path) -> None:
+    """ Cached tables are identical to freshly parsed tables. """
+
+    cache_dir = tmp_path / 'cache'
+    functions, connections = parse_xfmv(coloured_xfmv)
+
+    cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+    cached = cache.load_cached(coloured_xfmv, cache_dir)
+
+    assert cached is not None
+    pd.testing.assert_frame_equal(cached[0], functions)
+    pd.testing.assert_frame_equal(cached[1], connections)
+
+
+def test_cache_hit_skips_parsing(coloured_xfmv: str,
+                                 tmp_path: Path,
+                                 monkeypatch: pytest.MonkeyPatch) -> None:
+    """ A cache hit does not parse the XML. """
+
+    cache_dir = tmp_path / 'cache'
+    fram = framalytics.FRAM(coloured_xfmv, cache_dir=str(cache_dir))
+
+    def fail(*args: object, **kwargs: object) -> None:
+        raise AssertionError("parse_xfmv should not be called")
+
+    monkeypatch.setattr(cache, 'parse_xfmv', fail)
+
+    cached_fram = framalytics.FRAM(coloured_xfmv, cache_dir=str(cache_dir))
+
+    assert cached_fram.get_functions() == fram.get_functions()
+    assert cached_fram.number_of_connections() == fram.number_of_connections()
+
+
+def test_cache_invalidation(coloured_xfmv: str, tmp_path: Path) -> None:
+    """ Modifying the file invalidates its cache entry. """
+
+    cache_dir = tmp_path / 'cache'
+    cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+
+    text = Path(coloured_xfmv).read_text()
+    Path(coloured_xfmv).write_text(text.replace('B4', 'Renamed'))
+
+    assert cache.load_cached(coloured_xfmv, cache_dir) is None
+
+    functions, _ = cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+    assert 'Renamed' in set(functions.IDName)
+
+
+def test_cache_eviction(coloured_xfmv: str, tmp_path: Path) -> None:
+    """ The least recently used entries are evicted past the size cap. """
+
+    cache_dir = tmp_path / 'cache'
+    other = tmp_path / 'other.xfmv'
+    shutil.copy(Path(__file__).parent / 'resources/simple_fram.xfmv', other)
+
+    cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+    entry = next(cache_dir.glob('*.npz'))
+    os.utime(entry, (0, 0))
+
+    cache.parse_xfmv_cached(other, cache_dir,
+                            max_bytes=entry.stat().st_size + 1)
+
+    assert not entry.exists()
+    assert cache.load_cached(other, cache_dir) is not None
+
+
+@pytest.mark.parametrize('contents', [None, b'', b'not a zip archive'],
+                         ids=['truncated', 'empty', 'garbage'])
+def test_cache_corrupt_entry(coloured_xfmv: str,
+                             tmp_path: Path,
+                             contents: bytes | None) -> None:
+    """ A corrupt entry is dropped and replaced by a fresh parse. """
+
+    cache_dir = tmp_path / 'cache'
+    functions, connections = cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+    entry = next(cache_dir.glob('*.npz'))
+
+    data = entry.read_bytes()
+    entry.write_bytes(data[:len(data) // 2] if contents is None else contents)
+
+    assert cache.load_cached(coloured_xfmv, cache_dir) is None
+    assert not entry.exists()
+
+    reparsed = cache.parse_xfmv_cached(coloured_xfmv, cache_dir)
+    pd.testing.assert_frame_equal(reparsed[0], functions)
+    pd.testing.assert_frame_equal(reparsed[1], connections)
+
+    cached = cache.load_cached(coloured_xfmv, cache_dir)
+    assert cached is not None
+    pd.testing.assert_frame_equal(cached[1], connections)
+
+
+def test_pack_tables_strings() -> None:
+    """ Strings are stored without padding and round trip exactly. """
+
+    functions = pd.DataFrame({'Description': ['x' * 4000] + ['é'] * 999,
+                              'IDNr': range(1000)})
+    connections = pd.DataFrame({'Name': ['a', None, '']})
+
+    arrays = cache.pack_tables(functions, connections)
+
+    assert sum(array.nbytes for array in arrays.values()) < 30_000
+
+    unpacked_functions, unpacked_connections = cache.unpack_tables(arrays)
+    pd.testing.assert_frame_equal(unpacked_functions, functions)
+    assert unpacked_connections['Name'].isna().tolist() == [False, True,
+                                                            False]
+    assert unpacked_connections['Name'][[0, 2]].tolist() == ['a', '']
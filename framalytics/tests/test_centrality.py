@@ -0,0 +1,47 @@
+import numpy as np
+
+from framalytics import centrality
+from framalytics.tests.helpers import make_graph
+
+
+def test_betweenness() -> None:
+    # Two paths from 0 to 3, one through 1 and one through 2, then on to 4.
+    # The repeated connection 0 -> 1 does not add a path.
+    graph = make_graph(5, [(0, 1), (0, 1), (0, 2), (1, 3), (2, 3), (3, 4)])
+    keep = graph.edge_mask()
+
+    result = centrality.betweenness(graph, keep)
+
+    # 1 and 2 each carry half of the paths 0 -> 3 and 0 -> 4, and 3 carries
+    # 0 -> 4, 1 -> 4 and 2 -> 4.
+    expected = np.array([0.0, 1.0, 1.0, 3.0, 0.0]) / (4 * 3)
+    assert np.allclose(result, expected)
+
+    # Sampling every source is exact
+    sampled = centrality.betweenness(graph, keep, sources=np.arange(5))
+    assert np.allclose(sampled, expected)
+
+
+def test_pagerank() -> None:
+    graph = make_graph(3, [(0, 1), (1, 2), (2, 0)])
+    result = centrality.pagerank(graph, graph.edge_mask())
+
+    assert np.isclose(result.sum(), 1.0)
+    assert np.allclose(result, 1 / 3)
+
+    # Functions with no outputs spread their rank over all functions
+    graph = make_graph(3, [(0, 2), (1, 2)])
+    result = centrality.pagerank(graph, graph.edge_mask())
+
+    assert np.isclose(result.sum(), 1.0)
+    assert result[2] > result[0] == result[1]
+
+
+def test_eigenvector() -> None:
+    # A loop fed by a function with no inputs
+    graph = make_graph(4, [(0, 1), (1, 2), (2, 0), (3, 0)])
+    result = centrality.eigenvector(graph, graph.edge_mask())
+
+    assert np.isclose(np.linalg.norm(result), 1.0)
+    assert np.allclose(result[:3], 1 / np.sqrt(3), atol=1e-4)
+    assert np.isclose(result[3], 0.0, atol=1e-4)
@@ -0,0 +1,163 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from framalytics import event_log
+from framalytics.event_log import directly_follows, events_to_observations
+
+
+@pytest.fixture
+def events() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    n = 5000
+    return pd.DataFrame({'case_id': rng.integers(0, 700, n),
+                         'function': rng.choice(['a', 'b', 'c', 'x'], n),
+                         'timestamp': rng.permutation(n)})
+
+
+def _presence(events: pd.DataFrame,
+              cases: pd.Index,
+              functions: list[str]) -> np.ndarray:
+    """ Which functions each case has an event of, by grouping. """
+
+    grouped = events.groupby('case_id')['function'].agg(set)
+    return np.array([[function in grouped[case] for function in functions]
+                     for case in cases])
+
+
+def test_events_to_observations(events: pd.DataFrame) -> None:
+    functions = ['c', 'a', 'b']
+    observations, cases = events_to_observations(events, functions,
+                                                 chunksize=333)
+
+    assert observations.packed
+    assert observations.columns.tolist() == functions
+    assert cases.name == 'case_id'
+    assert cases.is_unique
+    assert set(cases) == set(events['case_id'])
+
+    present = np.column_stack([observations.present(function)
+                               for function in functions])
+    assert (present == _presence(events, cases, functions)).all()
+
+    # The order of the events does not matter
+    shuffled, shuffled_cases = events_to_observations(
+        events.sample(frac=1, random_state=1), functions, chunksize=1000)
+    rows = shuffled_cases.get_indexer(cases)
+    assert (shuffled.values[rows] == observations.values).all()
+
+
+def test_events_to_observations_missing() -> None:
+    events = pd.DataFrame({'case': ['p', None, 'q', 'p'],
+                           'activity': ['a', 'b', 'z', 'b']})
+    observations, cases = events_to_observations(events, ['a', 'b'],
+                                                 case_column='case',
+                                                 function_column='activity')
+
+    assert cases.tolist() == ['p', 'q']
+    assert observations.present('a').tolist() == [True, False]
+    assert observations.present('b').tolist() == [True, False]
+
+    observations, cases = events_to_observations(iter([]), ['a'])
+    assert len(observations) == len(cases) == 0
+
+
+def test_events_to_observations_files(events: pd.DataFrame,
+                                      tmp_path: Path) -> None:
+    functions = ['a', 'b', 'c']
+    expected, expected_cases = events_to_observations(events, functions)
+
+    file = tmp_path / 'events.csv.gz'
+    events.to_csv(file, index=False)
+    observations, cases = events_to_observations(file, functions,
+                                                 chunksize=700)
+    assert (cases == expected_cases).all()
+    assert (observations.values == expected.values).all()
+
+    pytest.importorskip('pyarrow')
+    file = tmp_path / 'events.parquet'
+    events.to_parquet(file, row_group_size=1000)
+    observations, cases = events_to_observations(file, functions)
+    assert (cases == expected_cases).all()
+    assert (observations.values == expected.values).all()
+
+    # Directories are searched for both Parquet suffixes
+    (tmp_path / 'log').mkdir()
+    file.rename(tmp_path / 'log' / 'events.pq')
+    observations, cases = events_to_observations(tmp_path / 'log', functions)
+    assert (cases == expected_cases).all()
+    assert (observations.values == expected.values).all()
+
+
+def _follows(events: pd.DataFrame,
+             functions: list[str]) -> dict[tuple[int, int], int]:
+    """ Count the directly-follows transitions of each case, one by one. """
+
+    counts: dict[tuple[int, int], int] = {}
+    for _, case in events.sort_values('timestamp').groupby('case_id'):
+        steps = [functions.index(f) for f in case['function']]
+        for pair in zip(steps, steps[1:]):
+            counts[pair] = counts.get(pair, 0) + 1
+
+    return counts
+
+
+@pytest.mark.parametrize("dense_pairs", [event_log.DENSE_PAIRS, 1])
+def test_directly_follows(events: pd.DataFrame,
+                          dense_pairs: int,
+                          monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(event_log, 'DENSE_PAIRS', dense_pairs)
+    functions = ['c', 'a', 'b']
+    expected = _follows(events, functions + ['x'])
+
+    transitions, names = directly_follows(events, functions, chunksize=333)
+    assert transitions['count'].dtype == np.int64
+    assert names.tolist() == functions + ['x']
+    assert names.name == 'function'
+    assert dict(zip(zip(transitions['from'], transitions['to']),
+                    transitions['count'])) == expected
+
+    # A stream sorted by time, in chunks with shuffled events
+    ordered = events.sort_values('timestamp')
+    chunks = (ordered.iloc[start:start + 500].sample(frac=1, random_state=0)
+              for start in range(0, len(ordered), 500))
+    streamed, _ = directly_follows(chunks, functions)
+    assert streamed.equals(transitions)
+
+    untimed, _ = directly_follows(ordered, functions, time_column=None)
+    assert untimed.equals(transitions)
+
+
+def test_directly_follows_hashed(monkeypatch: pytest.MonkeyPatch) -> None:
+    """ Counting by hashing, over many chunks, matches counting densely. """
+
+    rng = np.random.default_rng(4)
+    n = 20000
+    functions = [f'f{i}' for i in range(60)]
+    events = pd.DataFrame({'case_id': rng.integers(0, 300, n),
+                           'function': rng.choice(functions, n),
+                           'timestamp': np.arange(n)})
+
+    dense, _ = directly_follows(events, functions, chunksize=97)
+
+    monkeypatch.setattr(event_log, 'DENSE_PAIRS', 1)
+    hashed, _ = directly_follows(events, functions, chunksize=97)
+
+    assert len(hashed) > 1000
+    assert hashed.equals(dense)
+
+
+def test_directly_follows_unknown() -> None:
+    """ An event of an unknown function breaks the chain of its case. """
+
+    events = pd.DataFrame({'case_id': [1, 1, 1, 2, 2, 2],
+                           'function': ['a', 'X', 'b', 'a', None, 'b'],
+                           'timestamp': [1, 2, 3, 1, 2, 3]})
+
+    transitions, names = directly_follows(events, ['a', 'b'])
+
+    assert names.tolist() == ['a', 'b', 'X']
+    assert transitions.to_dict('list') == {'from': [0, 2], 'to': [2, 1],
+                                           'count': [1, 1]}
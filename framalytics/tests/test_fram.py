@@ -2,8 +2,12 @@ from pathlib import Path
 
 import pytest
 
+import numpy as np
 import pandas as pd
 import framalytics
+from framalytics.event_log import events_to_observations
+from framalytics.observations import ObservationMatrix, save_observations
+from framalytics.xfmv_parser import available_engines
 
 
 @pytest.fixture
@@ -150,3 +154,518 @@ def test_visualize(request: pytest.FixtureRequest,
     ax = fram.visualize()
     # Verify it returns a matplotlib axes object
     assert ax is not None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_many(simple_xfmv: str,
+                   coloured_xfmv: str,
+                   workers: int) -> None:
+    """ load_many returns the same models as loading files one by one. """
+
+    frams = framalytics.FRAM.load_many([simple_xfmv, coloured_xfmv],
+                                       workers=workers)
+
+    assert list(frams) == [simple_xfmv, coloured_xfmv]
+
+    for filename, fram in frams.items():
+        assert isinstance(fram, framalytics.FRAM)
+        expected = framalytics.FRAM(filename)
+
+        assert fram.get_functions() == expected.get_functions()
+        pd.testing.assert_frame_equal(fram.get_connections(),
+                                      expected.get_connections())
+
+
+def test_load_many_errors(simple_xfmv: str, tmp_path: Path) -> None:
+    """ load_many reports failures per file. """
+
+    missing = str(tmp_path / 'missing.xfmv')
+
+    with pytest.raises(ValueError, match='missing.xfmv'):
+        framalytics.FRAM.load_many([simple_xfmv, missing], workers=2)
+
+    frams = framalytics.FRAM.load_many([simple_xfmv, missing], workers=2,
+                                       errors='return')
+
+    assert isinstance(frams[simple_xfmv], framalytics.FRAM)
+    assert isinstance(frams[missing], FileNotFoundError)
+
+
+@pytest.mark.parametrize("engine", available_engines())
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_many_parse_errors(simple_xfmv: str,
+                                tmp_path: Path,
+                                engine: str,
+                                workers: int) -> None:
+    """ Malformed files are reported with their parse error. """
+
+    invalid = tmp_path / 'invalid.xfmv'
+    invalid.write_text('<FM><Functions><Function>')
+
+    frams = framalytics.FRAM.load_many([simple_xfmv, str(invalid)],
+                                       workers=workers, engine=engine,
+                                       errors='return')
+
+    assert isinstance(frams[simple_xfmv], framalytics.FRAM)
+    assert isinstance(frams[str(invalid)], SyntaxError)
+
+
+def test_fram_from_bytes(simple_xfmv: str, fram: framalytics.FRAM) -> None:
+    """ A FRAM can be loaded from the raw contents of an .xfmv file. """
+
+    fram_from_bytes = framalytics.FRAM(Path(simple_xfmv).read_bytes())
+
+    assert fram_from_bytes.filename is None
+    assert fram_from_bytes.get_functions() == fram.get_functions()
+    assert (fram_from_bytes.number_of_connections()
+            == fram.number_of_connections())
+
+
+def test_lazy_loading(simple_xfmv: str, fram: framalytics.FRAM) -> None:
+    """ Lazy loading defers parsing the connections until they are used. """
+
+    lazy_fram = framalytics.FRAM(simple_xfmv, lazy=True)
+
+    assert lazy_fram._connections is None
+    assert lazy_fram.get_functions() == fram.get_functions()
+    assert lazy_fram.number_of_functions() == 6
+    assert lazy_fram._connections is None
+
+    pd.testing.assert_frame_equal(lazy_fram.get_connections(),
+                                  fram.get_connections())
+    assert lazy_fram._connections is not None
+
+
+@pytest.mark.parametrize("aspect, get_function",
+                         [('I', 'get_function_inputs'),
+                          ('T', 'get_function_times'),
+                          ('C', 'get_function_controls'),
+                          ('P', 'get_function_preconditions'),
+                          ('R', 'get_function_resources')])
+def test_get_connection_sources_exact(colored_fram: framalytics.FRAM,
+                                      aspect: str,
+                                      get_function: str) -> None:
+    """ get_function_* return exactly the connected functions. """
+
+    connections = colored_fram.get_connections()
+
+    for IDNr in colored_fram.get_functions():
+        fns = getattr(colored_fram, get_function)(IDNr)
+
+        expected = connections[(connections.toAspect == aspect)
+                               & (connections.toFn == IDNr)]['fromFn']
+
+        assert set(fns) == set(expected)
+
+        outputs = colored_fram.get_function_outputs(IDNr)
+        assert set(outputs) == set(connections[connections.fromFn
+                                               == IDNr]['toFn'])
+
+
+def test_get_connection_sources_unknown(fram: framalytics.FRAM) -> None:
+    """ Unknown function IDs have no connected functions. """
+
+    assert fram.get_function_inputs(100) == {}
+    assert fram.get_function_outputs(100) == {}
+
+    with pytest.raises(ValueError):
+        fram.get_function_inputs(1.5)  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize("direction", ['in', 'out'])
+def test_neighbors(colored_fram: framalytics.FRAM, direction: str) -> None:
+    """ neighbors matches the per-function get_function_* queries. """
+
+    neighbors = colored_fram.neighbors(direction=direction)
+    assert list(neighbors.columns) == ['function', 'neighbor', 'aspect']
+    assert len(neighbors) == colored_fram.number_of_connections()
+
+    for IDNr in colored_fram.get_functions():
+        rows = neighbors[neighbors.function == IDNr]
+        if direction == 'out':
+            expected = colored_fram.get_function_outputs(IDNr)
+            assert set(rows.neighbor) == set(expected)
+            continue
+
+        for aspect, get_function in [('I', 'get_function_inputs'),
+                                     ('T', 'get_function_times'),
+                                     ('C', 'get_function_controls'),
+                                     ('P', 'get_function_preconditions'),
+                                     ('R', 'get_function_resources')]:
+            expected = getattr(colored_fram, get_function)(IDNr)
+            assert set(rows[rows.aspect == aspect].neighbor) == set(expected)
+
+
+def test_neighbors_filtered(fram: framalytics.FRAM) -> None:
+    neighbors = fram.neighbors(['Function B', 4], aspects=['I', 'P'])
+
+    assert neighbors.function.tolist() == [1, 4, 4]
+    assert neighbors.neighbor.tolist() == [0, 2, 3]
+    assert neighbors.aspect.tolist() == ['I', 'P', 'P']
+
+    assert fram.neighbors([], direction='out').empty
+
+    with pytest.raises(ValueError):
+        fram.neighbors([100])
+    with pytest.raises(ValueError):
+        fram.neighbors(aspects=['X'])
+    with pytest.raises(ValueError):
+        fram.neighbors(direction='both')
+
+
+def test_downstream_upstream(fram: framalytics.FRAM) -> None:
+    assert set(fram.downstream('Function C')) == {0, 1, 3, 4}
+    assert set(fram.downstream(4)) == set()
+    assert set(fram.upstream('Function E')) == {0, 1, 2, 3, 5}
+
+    # Functions A and B form a loop, so each is downstream of itself
+    assert set(fram.downstream('Function A')) == {0, 1, 3, 4}
+    assert set(fram.upstream(0)) == {0, 1, 2}
+
+    assert fram.downstream(100) == {}
+
+
+def test_dangling_connection(simple_xfmv: str, tmp_path: Path) -> None:
+    """ A connection to an unknown function does not break other queries. """
+
+    text = Path(simple_xfmv).read_text()
+    text = text.replace('outputFn="3" toFn="4"><Name>3|Connection DE|4|P',
+                        'outputFn="3" toFn="99"><Name>3|Connection DE|99|P')
+    file = tmp_path / 'dangling.xfmv'
+    file.write_text(text)
+
+    fram = framalytics.FRAM(str(file))
+
+    assert fram.number_of_connections() == 8
+    assert set(fram.downstream('Function C')) == {0, 1, 3, 4}
+    assert set(fram.downstream('Function D')) == set()
+    assert set(fram.upstream('Function E')) == {2, 5}
+    assert len(fram.neighbors(direction='out')) == 7
+    assert fram.centrality('degree')['out'].sum() == 7
+
+    assert fram.highlight_full_path_from_function('Function D') is not None
+
+
+def test_can_influence(colored_fram: framalytics.FRAM) -> None:
+    """ The transitive closure agrees with downstream for every pair. """
+
+    ids = list(colored_fram.get_functions())
+    for source in ids:
+        downstream = colored_fram.downstream(source)
+        for target in ids:
+            assert (colored_fram.can_influence(source, target)
+                    == (target in downstream))
+
+    assert not colored_fram.can_influence(ids[0], 100)
+
+
+def test_feedback_loops(fram: framalytics.FRAM) -> None:
+    loops, components, dag = fram.feedback_loops()
+
+    # Functions A and B connect to each other
+    assert [loop.tolist() for loop in loops] == [[0, 1]]
+    assert components[0] == components[1]
+    assert len(set(components.tolist())) == fram.number_of_functions() - 1
+
+    assert list(dag.columns) == ['fromComponent', 'toComponent',
+                                 'connections']
+    assert (dag.fromComponent < dag.toComponent).all()
+    assert dag.connections.sum() == fram.number_of_connections() - 2
+
+    # The loop is made of input connections
+    loops, components, dag = fram.feedback_loops(aspects=['C', 'T', 'P'])
+    assert loops == []
+    assert len(set(components.tolist())) == fram.number_of_functions()
+
+
+@pytest.mark.parametrize("kind", ['pagerank', 'betweenness', 'eigenvector'])
+def test_centrality(fram: framalytics.FRAM, kind: str) -> None:
+    result = fram.centrality(kind)
+
+    assert list(result.columns) == [kind]
+    assert result.index.tolist() == list(fram.get_functions())
+    assert (result[kind] >= 0).all()
+
+
+def test_centrality_degree(fram: framalytics.FRAM) -> None:
+    degree = fram.centrality('degree')
+    connections = fram.get_connections()
+
+    for IDNr, row in degree.iterrows():
+        inputs = connections[connections.toFn == IDNr]
+        outputs = connections[connections.fromFn == IDNr]
+
+        assert row['in'] == len(inputs)
+        assert row['out'] == len(outputs)
+        for aspect in ['I', 'T', 'C', 'P', 'R']:
+            assert row[f'in_{aspect}'] == (inputs.toAspect == aspect).sum()
+            assert row[f'out_{aspect}'] == (outputs.toAspect == aspect).sum()
+
+    degree = fram.centrality('degree', aspects=['I'])
+    assert degree['in'].sum() == (connections.toAspect == 'I').sum()
+
+    with pytest.raises(ValueError):
+        fram.centrality('closeness')
+
+
+def test_to_sparse(fram: framalytics.FRAM) -> None:
+    pytest.importorskip('scipy')
+
+    matrix, ids = fram.to_sparse()
+    assert matrix.shape == (6, 6)
+    assert matrix.sum() == fram.number_of_connections()
+
+    connections = fram.get_connections()
+    for fromFn, toFn in zip(connections.fromFn, connections.toFn):
+        assert matrix[ids.get_loc(fromFn), ids.get_loc(toFn)] == 1
+
+    matrix, ids = fram.to_sparse(aspects=['I'], weight=[2.0] * 8)
+    assert matrix.sum() == 2.0 * (connections.toAspect == 'I').sum()
+
+
+def test_to_networkx(fram: framalytics.FRAM) -> None:
+    pytest.importorskip('networkx')
+
+    G = fram.to_networkx()
+    assert G.number_of_nodes() == fram.number_of_functions()
+    assert G.number_of_edges() == fram.number_of_connections()
+    assert G.nodes[0]['name'] == 'Function A'
+
+    (attributes,) = G.get_edge_data(2, 1).values()
+    assert attributes == {'aspect': 'C', 'name': 'Connection CB'}
+
+
+@pytest.fixture
+def observations(fram: framalytics.FRAM) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    names = list(fram.get_functions().values())
+    return pd.DataFrame(rng.choice([0, 1, 2], size=(500, len(names)),
+                                   p=[0.4, 0.5, 0.1]),
+                        columns=names)
+
+
+def test_count_data_connections(fram: framalytics.FRAM,
+                                observations: pd.DataFrame) -> None:
+    frequencies = fram._count_data_connections(observations, 'functions')
+
+    connections = fram._get_connection_data()
+    assert list(frequencies) == connections['Name'].tolist()
+
+    for name, fromFn, toFn in zip(connections.Name, connections.outputFn,
+                                  connections.toFn):
+        both = ((observations[fram.get_function_name(fromFn)] == 1)
+                & (observations[fram.get_function_name(toFn)] == 1))
+        assert frequencies[name] == both.sum() / len(observations)
+
+    by_connection = pd.DataFrame({name: observations['Function A']
+                                  for name in connections.Name})
+    frequencies = fram._count_data_connections(by_connection, 'connections')
+    expected = (observations['Function A'] == 1).mean()
+    assert all(value == expected for value in frequencies.values())
+
+    with pytest.raises(ValueError):
+        fram._count_data_connections(observations, 'rows')
+    with pytest.raises(ValueError):
+        fram._count_data_connections(observations.iloc[:0])
+
+
+def test_count_connections(fram: framalytics.FRAM,
+                           observations: pd.DataFrame,
+                           tmp_path: Path) -> None:
+    """ Chunked and file sources give the same counts as a DataFrame. """
+
+    expected = fram._count_data_connections(observations)
+
+    chunks = (observations.iloc[i:i + 64]
+              for i in range(0, len(observations), 64))
+    assert fram.count_connections(chunks) == expected
+
+    # Unused columns are not read from files
+    file = tmp_path / 'observations.csv.gz'
+    observations.assign(Extra='x').to_csv(file, index=False)
+    assert fram.count_connections(file, chunksize=100) == expected
+    assert fram.count_connections(str(file)) == expected
+
+    with pytest.raises(ValueError):
+        fram.count_connections(iter([]))
+
+
+def test_highlight_data(fram: framalytics.FRAM,
+                        observations: pd.DataFrame) -> None:
+    frequencies = fram.count_connections(observations)
+
+    assert fram.highlight_data(observations) is not None
+    assert fram.highlight_data(frequencies, appearance='expand') is not None
+
+
+def test_count_connections_parallel(fram: framalytics.FRAM,
+                                    observations: pd.DataFrame) -> None:
+    """ Counting across worker processes matches counting serially. """
+
+    names = fram._get_connection_data().Name
+    by_connection = pd.DataFrame({name: observations['Function B']
+                                  for name in names})
+
+    for column_type, data in [('functions', observations),
+                              ('connections', by_connection)]:
+        expected = fram.count_connections(data, column_type)
+        assert fram.count_connections(data, column_type, chunksize=77,
+                                      workers=2) == expected
+
+    with pytest.raises(KeyError):
+        fram.count_connections(observations.drop(columns='Function A'),
+                               workers=2)
+
+
+def test_count_connections_matrix(fram: framalytics.FRAM,
+                                  observations: pd.DataFrame) -> None:
+    """ Sparse and array observations give the same counts as dense ones. """
+
+    expected = fram.count_connections(observations)
+
+    sparse = observations.astype(pd.SparseDtype(int, 0))
+    assert fram.count_connections(sparse) == expected
+
+    values = np.packbits(observations.to_numpy() == 1, axis=1)
+    matrix = ObservationMatrix(values, observations.columns, packed=True)
+    assert fram.count_connections(matrix, chunksize=100) == expected
+    assert fram.count_connections(matrix, workers=2) == expected
+
+
+def test_count_connections_parquet(fram: framalytics.FRAM,
+                                   observations: pd.DataFrame,
+                                   tmp_path: Path) -> None:
+    pytest.importorskip('pyarrow')
+
+    file = tmp_path / 'observations.parquet'
+    observations.to_parquet(file, row_group_size=128)
+
+    expected = fram.count_connections(observations)
+    assert fram.count_connections(file, chunksize=100) == expected
+
+
+def test_count_connections_saved(fram: framalytics.FRAM,
+                                 observations: pd.DataFrame,
+                                 tmp_path: Path) -> None:
+    save_observations(tmp_path / 'saved', observations, chunksize=128)
+
+    expected = fram.count_connections(observations)
+    assert fram.count_connections(tmp_path / 'saved') == expected
+    assert fram.count_connections(tmp_path / 'saved', workers=2) == expected
+
+
+@pytest.mark.parametrize("window, step", [(60, 60), (90, 20), (30, 70)])
+def test_connection_frequencies_over_time(fram: framalytics.FRAM,
+                                          observations: pd.DataFrame,
+                                          window: int,
+                                          step: int) -> None:
+    """ Sliding windows match counting each window on its own. """
+
+    rng = np.random.default_rng(2)
+    data = observations.assign(time=rng.uniform(0, 500, len(observations)))
+
+    frequencies = fram.connection_frequencies_over_time(data, 'time',
+                                                        window, step)
+    assert frequencies.index[0].left == data['time'].min()
+
+    for interval, (_, row) in zip(frequencies.index, frequencies.iterrows()):
+        inside = data[(data['time'] >= interval.left)
+                      & (data['time'] < interval.right)]
+        if len(inside) == 0:
+            assert row.isna().all()
+        else:
+            assert row.to_dict() == fram.count_connections(inside)
+
+
+def test_connection_frequencies_over_time_datetime(
+        fram: framalytics.FRAM,
+        observations: pd.DataFrame) -> None:
+    times = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        np.arange(len(observations)), unit='min')
+    data = observations.assign(time=times)
+
+    frequencies = fram.connection_frequencies_over_time(data, 'time', '2h',
+                                                        step='1h')
+    assert len(frequencies) == 9
+    assert frequencies.index[1].left == pd.Timestamp('2024-01-01 01:00')
+    assert (frequencies.iloc[1].to_dict()
+            == fram.count_connections(observations.iloc[60:180]))
+
+    with pytest.raises(ValueError):
+        fram.connection_frequencies_over_time(data, 'time', '-1h')
+
+    frames = list(fram.highlight_over_time(frequencies.iloc[:3]))
+    assert len(frames) == 3
+    assert frames[0] is frames[-1]
+    assert frames[-1].get_title() == str(frequencies.index[2])
+
+
+def test_count_connections_events(fram: framalytics.FRAM) -> None:
+    """ Observations converted from an event log can be counted. """
+
+    names = list(fram.get_functions().values())
+    rng = np.random.default_rng(3)
+    events = pd.DataFrame({'case_id': rng.integers(0, 50, 400),
+                           'function': rng.choice(names, 400)})
+
+    observations, cases = events_to_observations(events, names)
+    dense = pd.DataFrame({name: observations.present(name).astype(int)
+                          for name in names}, index=cases)
+
+    expected = fram.count_connections(dense)
+    assert fram.count_connections(observations) == expected
+
+
+def test_conformance(fram: framalytics.FRAM) -> None:
+    # Case 1: C -> B -> D -> E, case 2: A -> B -> A -> F, out of order
+    events = pd.DataFrame({
+        'case_id': [2, 1, 1, 2, 1, 2, 1, 2, 1],
+        'function': ['Function B', 'Function C', 'Function B', 'Function A',
+                     'Function D', 'Function A', 'Function E', 'Function F',
+                     'Unknown'],
+        'timestamp': [2, 1, 2, 1, 3, 3, 4, 4, 5]})
+
+    matched, unobserved, unmodelled = fram.conformance(events)
+
+    assert matched['Name'].tolist() == ['Connection CB', 'Connection BA',
+                                        'Connection BD', 'Connection AB',
+                                        'Connection DE']
+    assert matched['count'].tolist() == [1, 1, 1, 1, 1]
+    assert unobserved['Name'].tolist() == ['Connection CD', 'Connection CE',
+                                           'Connection FE']
+    assert 'count' not in unobserved
+
+    assert unmodelled.to_dict('list') == {'fromFn': [0, 4],
+                                          'toFn': [5, 'Unknown'],
+                                          'count': [1, 1]}
+
+
+def test_conformance_unknown_function(fram: framalytics.FRAM) -> None:
+    """ A function not in the model breaks a transition between two. """
+
+    # Connection AB exists, but the case goes A -> X -> B
+    events = pd.DataFrame({'case_id': [1, 1, 1],
+                           'function': ['Function A', 'X', 'Function B'],
+                           'timestamp': [1, 2, 3]})
+
+    matched, unobserved, unmodelled = fram.conformance(events)
+
+    assert len(matched) == 0
+    assert len(unobserved) == fram.number_of_connections()
+    assert unmodelled.to_dict('list') == {'fromFn': [0, 'X'],
+                                          'toFn': ['X', 1],
+                                          'count': [1, 1]}
+
+
+@pytest.mark.parametrize("events", [
+    pd.DataFrame({'case_id': [1, 2], 'function': ['Function A', 'Function B'],
+                  'timestamp': [1, 2]}),
+    pd.DataFrame({'case_id': [], 'function': [], 'timestamp': []}),
+])
+def test_conformance_no_transitions(fram: framalytics.FRAM,
+                                    events: pd.DataFrame) -> None:
+    matched, unobserved, unmodelled = fram.conformance(events)
+
+    assert len(matched) == 0
+    assert len(unobserved) == fram.number_of_connections()
+    assert len(unmodelled) == 0
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import pytest
+
+import framalytics
+from framalytics.generator import generate_xfmv
+
+
+@pytest.fixture
+def generated_xfmv(tmp_path: Path) -> str:
+    file = tmp_path / 'generated.xfmv'
+    generate_xfmv(file, n_functions=50, n_connections=120, seed=0)
+    return str(file)
+
+
+def test_generated_model(generated_xfmv: str) -> None:
+    """ A generated model has the requested number of elements. """
+
+    fram = framalytics.FRAM(generated_xfmv)
+
+    assert fram.number_of_functions() == 50
+    assert fram.number_of_connections() == 120
+
+    connections = fram.get_connections()
+    assert (connections.fromFn != connections.toFn).all()
+    assert set(connections.toAspect) <= {'I', 'P', 'R', 'C', 'T'}
+
+
+def test_generated_synthesized_model(generated_xfmv: str,
+                                     tmp_path: Path) -> None:
+    """ Synthesized connections match the explicit connections. """
+
+    file = tmp_path / 'synthesized.xfmv'
+    generate_xfmv(file, n_functions=50, n_connections=120, seed=0,
+                  synthesized=True)
+
+    connections = framalytics.FRAM(generated_xfmv).get_connections()
+    synthesized = framalytics.FRAM(str(file)).get_connections()
+
+    columns = ['fromFn', 'toFn', 'toAspect']
+    assert (set(map(tuple, connections[columns].values.tolist()))
+            == set(map(tuple, synthesized[columns].values.tolist())))
+
+
+def test_generated_aspects(tmp_path: Path) -> None:
+    """ Connections only end at the requested aspects. """
+
+    file = tmp_path / 'aspects.xfmv'
+    generate_xfmv(file, n_functions=20, aspects={'T': 1.0, 'C': 1.0},
+                  seed=1)
+
+    connections = framalytics.FRAM(str(file)).get_connections()
+
+    assert set(connections.toAspect) == {'T', 'C'}
+
+    with pytest.raises(ValueError):
+        generate_xfmv(file, n_functions=20, aspects={'O': 1.0})
+
+    with pytest.raises(ValueError):
+        generate_xfmv(file, n_functions=0)
@@ -0,0 +1,63 @@
+import numpy as np
+
+from framalytics.tests.helpers import make_graph
+
+
+def test_components() -> None:
+    # 0 -> (1 <-> 2) -> 3, and 4 on its own
+    graph = make_graph(5, [(0, 1), (1, 2), (2, 1), (2, 3)])
+    labels, n_components = graph.components()
+
+    assert n_components == 4
+    assert labels[1] == labels[2]
+    assert len(set(labels[[0, 1, 3, 4]].tolist())) == 4
+
+    # Topological order: every edge leads to an equal or higher component
+    assert (labels[graph.src] <= labels[graph.dst]).all()
+
+
+def test_components_aspects() -> None:
+    graph = make_graph(2, [(0, 1), (1, 0)], aspect='C')
+
+    assert graph.components()[1] == 1
+    assert graph.components(aspects=['C'])[1] == 1
+    assert graph.components(aspects=['I'])[1] == 2
+
+
+def test_components_deep() -> None:
+    """ Long paths do not hit the recursion limit. """
+
+    n = 50000
+    ring = [(i, (i + 1) % n) for i in range(n)]
+    labels, n_components = make_graph(n, ring).components()
+
+    assert n_components == 1
+    assert (labels == 0).all()
+
+    chain = make_graph(n, ring[:-1])
+    labels, n_components = chain.components()
+
+    assert n_components == n
+    assert (labels == np.arange(n)).all()
+    assert chain.can_reach(0, n - 1)
+    assert not chain.can_reach(n - 1, 0)
+
+
+def test_adjacency() -> None:
+    graph = make_graph(3, [(2, 0), (0, 1), (2, 0), (1, 2), (0, 2)])
+
+    indptr, indices, data = graph.adjacency(graph.edge_mask())
+    assert indptr.tolist() == [0, 2, 3, 4]
+    assert indices.tolist() == [1, 2, 2, 0]
+    assert data.tolist() == [1, 1, 1, 2]
+
+    weights = np.array([0.5, 1.0, 0.25, 2.0, 3.0])
+    keep = np.array([True, True, True, False, True])
+    indptr, indices, data = graph.adjacency(keep, weights)
+    assert indptr.tolist() == [0, 2, 2, 3]
+    assert indices.tolist() == [1, 2, 0]
+    assert data.tolist() == [1.0, 3.0, 0.75]
+
+    indptr, indices, data = graph.adjacency(np.zeros(5, dtype=bool))
+    assert indptr.tolist() == [0, 0, 0, 0]
+    assert len(indices) == len(data) == 0
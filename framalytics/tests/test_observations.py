@@ -0,0 +1,247 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from framalytics import observations
+from framalytics.observations import (ConnectionCounter, ObservationMatrix,
+                                      count_packed, count_parallel,
+                                      iter_observations, pack_observations)
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.choice([0, 1, 2], size=(1001, 4),
+                                   p=[0.5, 0.4, 0.1]),
+                        columns=['a', 'b', 'c', 'd'])
+
+
+def test_pack_observations(data: pd.DataFrame) -> None:
+    packed = pack_observations(data, ['c', 'a'])
+
+    assert packed.shape == (2, 126)
+    assert packed.dtype == np.uint8
+
+    unpacked = np.unpackbits(packed, axis=1, count=len(data)).astype(bool)
+    assert (unpacked[0] == (data['c'] == 1)).all()
+    assert (unpacked[1] == (data['a'] == 1)).all()
+
+    with pytest.raises(KeyError):
+        pack_observations(data, ['a', 'e'])
+
+
+def test_count_packed(data: pd.DataFrame,
+                      monkeypatch: pytest.MonkeyPatch) -> None:
+    columns = ['a', 'b', 'c', 'd']
+    packed = pack_observations(data, columns)
+
+    left = np.array([0, 1, 3, 2, 0])
+    right = np.array([1, 2, 0, 2, 3])
+    expected = [((data[columns[i]] == 1) & (data[columns[j]] == 1)).sum()
+                for i, j in zip(left, right)]
+
+    assert count_packed(packed, left, right).tolist() == expected
+    assert count_packed(packed, left).tolist() == [(data[columns[i]] == 1)
+                                                   .sum() for i in left]
+
+    # Counting in small chunks gives the same result
+    monkeypatch.setattr(observations, 'CHUNK_BYTES', 1)
+    assert count_packed(packed, left, right).tolist() == expected
+
+
+def test_connection_counter(data: pd.DataFrame) -> None:
+    left = np.array([0, 2])
+    right = np.array([1, 3])
+
+    whole = ConnectionCounter(['a', 'b', 'c', 'd'], left, right)
+    whole.add(data)
+
+    chunked = ConnectionCounter(['a', 'b', 'c', 'd'], left, right)
+    for chunk in iter_observations(iter([data.iloc[:300], data.iloc[300:]]),
+                                   chunked.columns):
+        chunked.add(chunk)
+
+    assert chunked.observations == whole.observations == len(data)
+    assert (chunked.counts == whole.counts).all()
+    assert (chunked.frequencies() == whole.counts / len(data)).all()
+
+    # Subtracting a chunk leaves the counts of the rest
+    chunked.subtract(data.iloc[:300])
+    rest = ConnectionCounter(['a', 'b', 'c', 'd'], left, right)
+    rest.add(data.iloc[300:])
+    assert chunked.observations == rest.observations == len(data) - 300
+    assert (chunked.counts == rest.counts).all()
+
+    with pytest.raises(ValueError):
+        ConnectionCounter(['a'], left).frequencies()
+
+
+@pytest.mark.parametrize("fill_value", [0, 1, np.nan])
+def test_pack_sparse(data: pd.DataFrame, fill_value: float) -> None:
+    """ Sparse columns pack to the same bits as dense columns. """
+
+    sparse = data.astype(pd.SparseDtype(float, fill_value))
+    assert isinstance(sparse['a'].dtype, pd.SparseDtype)
+
+    columns = ['a', 'b', 'c', 'd']
+    assert (pack_observations(sparse, columns)
+            == pack_observations(data, columns)).all()
+
+    # Padding bits of the last byte stay clear
+    for n in [1, 8, 13]:
+        assert (pack_observations(sparse.iloc[:n], columns)
+                == pack_observations(data.iloc[:n], columns)).all()
+
+
+@pytest.mark.parametrize("dtype", [bool, np.uint8])
+def test_observation_matrix(data: pd.DataFrame, dtype: type) -> None:
+    columns = ['a', 'b', 'c', 'd']
+    expected = pack_observations(data, ['d', 'b'])
+
+    values = (data[columns].to_numpy() == 1).astype(dtype)
+    matrix = ObservationMatrix(values, columns)
+    assert len(matrix) == len(data)
+    assert (pack_observations(matrix, ['d', 'b']) == expected).all()
+
+    packed = ObservationMatrix(np.packbits(values, axis=1), columns,
+                               packed=True)
+    assert (pack_observations(packed, ['d', 'b']) == expected).all()
+    assert (pack_observations(packed[8:24], ['d', 'b'])
+            == expected[:, 1:3]).all()
+
+    with pytest.raises(KeyError):
+        pack_observations(matrix, ['e'])
+    with pytest.raises(ValueError):
+        ObservationMatrix(values, columns[:3])
+    with pytest.raises(ValueError):
+        ObservationMatrix(values, columns, packed=True)
+
+
+def test_iter_parquet(data: pd.DataFrame, tmp_path: Path) -> None:
+    pq = pytest.importorskip('pyarrow.parquet')
+    pa = pytest.importorskip('pyarrow')
+
+    # Column 'a' is never present in the second row group, and no column is
+    # present in the third.
+    data = data.copy()
+    data.loc[400:799, 'a'] = 0
+    data.loc[800:, ['a', 'b', 'c', 'd']] = 0
+    file = tmp_path / 'observations.parquet'
+    pq.write_table(pa.Table.from_pandas(data.assign(e='x')), file,
+                   row_group_size=400)
+
+    columns = ['a', 'b']
+    chunks = list(iter_observations(file, columns, chunksize=250))
+    assert all(isinstance(chunk, ObservationMatrix) for chunk in chunks)
+    assert [len(chunk) for chunk in chunks] == [250, 150, 250, 150, 201]
+
+    # The last row group is not read at all
+    last = chunks[-1]
+    assert isinstance(last, ObservationMatrix)
+    assert last.values.strides[0] == 0
+
+    packed = np.concatenate([np.unpackbits(pack_observations(chunk, columns),
+                                           axis=1, count=len(chunk))
+                             for chunk in chunks], axis=1)
+    expected = (data[columns] == 1).to_numpy().T
+    assert (packed == expected).all()
+
+    # Directories are read as datasets, one file after another
+    (tmp_path / 'part').mkdir()
+    file.rename(tmp_path / 'part' / 'observations.parquet')
+    assert sum(len(chunk) for chunk in iter_observations(
+        tmp_path / 'part', columns)) == len(data)
+
+    with pytest.raises(KeyError):
+        list(iter_observations(tmp_path / 'part', ['a', 'f']))
+
+    # Both suffixes are found in a directory
+    pq.write_table(pa.Table.from_pandas(data), tmp_path / 'part' / 'more.pq')
+    assert sum(len(chunk) for chunk in iter_observations(
+        tmp_path / 'part', columns)) == 2 * len(data)
+
+    (tmp_path / 'empty').mkdir()
+    with pytest.raises(FileNotFoundError):
+        list(iter_observations(tmp_path / 'empty', columns))
+
+
+def test_save_observations(data: pd.DataFrame, tmp_path: Path) -> None:
+    saved = observations.save_observations(tmp_path / 'saved', data,
+                                           chunksize=300)
+
+    assert len(saved) == len(data)
+    assert saved.blocks == [300, 300, 300, 101]
+    assert saved.columns.tolist() == ['a', 'b', 'c', 'd']
+    assert isinstance(saved.bits, np.memmap)
+
+    chunks = list(iter_observations(tmp_path / 'saved', ['c', 'a']))
+    assert all(isinstance(chunk, observations.PackedColumns)
+               for chunk in chunks)
+
+    columns = ['c', 'a']
+    packed = np.concatenate([np.unpackbits(pack_observations(chunk, columns),
+                                           axis=1, count=len(chunk))
+                             for chunk in chunks], axis=1)
+    assert (packed == (data[columns] == 1).to_numpy().T).all()
+
+    # Counting the mapped bits matches counting the DataFrame
+    left = np.array([0, 2])
+    right = np.array([3, 1])
+    expected = ConnectionCounter(['d', 'a', 'b', 'c'], left, right)
+    expected.add(data)
+
+    counter = ConnectionCounter(['d', 'a', 'b', 'c'], left, right)
+    for chunk in chunks:
+        counter.add(chunk)
+    assert (counter.counts == expected.counts).all()
+
+    first = chunks[0]
+    assert isinstance(first, observations.PackedColumns)
+    with pytest.raises(KeyError):
+        counter.add(observations.PackedColumns(first.bits[:2], ['a', 'b'],
+                                               300))
+
+
+def test_save_observations_empty(tmp_path: Path) -> None:
+    saved = observations.save_observations(tmp_path, iter([]),
+                                           columns=['a', 'b'])
+
+    assert len(saved) == 0
+    assert list(saved) == []
+    assert saved.columns.tolist() == ['a', 'b']
+
+
+def test_count_parallel(data: pd.DataFrame) -> None:
+    """ Every layout counted in workers matches counting serially. """
+
+    columns = ['d', 'a', 'b', 'c']
+    left = np.array([0, 2, 3, 1])
+    right = np.array([1, 3, 0, 1])
+
+    expected = ConnectionCounter(columns, left, right)
+    expected.add(data)
+
+    values = data[['a', 'b', 'c', 'd']].to_numpy()
+    sources = [
+        data,
+        data.astype({'a': pd.SparseDtype(int, 0)}),
+        data.astype({'b': object}),
+        ObservationMatrix(values, data.columns),
+        ObservationMatrix(np.asfortranarray(values == 1), data.columns),
+        ObservationMatrix(np.packbits(values == 1, axis=1), data.columns,
+                          packed=True),
+        iter([ObservationMatrix(values[:500], data.columns),
+              ObservationMatrix(values[500:], data.columns)]),
+    ]
+    for source in sources:
+        counter = ConnectionCounter(columns, left, right)
+        count_parallel(counter, source, workers=2, chunksize=123)
+
+        assert counter.observations == len(data)
+        assert (counter.counts == expected.counts).all()
+
+    with pytest.raises(KeyError):
+        count_parallel(ConnectionCounter(['a', 'e'], left[:1]),
+                       ObservationMatrix(values, data.columns), workers=2)
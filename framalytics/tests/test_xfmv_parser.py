@@ -1,9 +1,22 @@
+import gzip
+import io
+import re
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
 import pytest
 
-from framalytics.xfmv_parser import parse_xfmv
+from framalytics.xfmv_parser import (XfmvSource,
+                                     available_engines,
+                                     create_bezier_curve,
+                                     create_bezier_curves,
+                                     curve_points,
+                                     format_curves,
+                                     open_xfmv,
+                                     parse_curves,
+                                     parse_xfmv)
 
 
 @pytest.fixture
@@ -18,9 +31,26 @@ def colored_xfmv() -> str:
     return str(file)
 
 
+@pytest.fixture
+def synthesized_xfmv(simple_xfmv: str, tmp_path: Path) -> str:
+    """ The simple model with its Aspect (connection) elements removed. """
+    text = Path(simple_xfmv).read_text()
+    text = re.sub(r'<Aspects.*?</Aspects>', '', text, flags=re.S)
+    file = tmp_path / 'synthesized_fram.xfmv'
+    file.write_text(text)
+    return str(file)
+
+
+@pytest.fixture(params=available_engines())
+def engine(request: pytest.FixtureRequest) -> str:
+    """ Every installed XML engine. """
+    return request.param
+
+
 @pytest.fixture()
-def parsed_xfmv(simple_xfmv: str) -> tuple[pd.DataFrame, pd.DataFrame]:
-    return parse_xfmv(simple_xfmv)
+def parsed_xfmv(simple_xfmv: str,
+                engine: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    return parse_xfmv(simple_xfmv, engine=engine)
 
 
 def test_return_types(parsed_xfmv: tuple[pd.DataFrame, pd.DataFrame]) -> None:
@@ -156,10 +186,10 @@ def test_connection_names(parsed_xfmv: tuple[pd.DataFrame,
     assert toFns == expected_toFns
 
 
-def test_function_description(colored_xfmv: str) -> None:
+def test_function_description(colored_xfmv: str, engine: str) -> None:
     """Test that function descriptions are parsed correctly."""
 
-    functions, connections = parse_xfmv(colored_xfmv)
+    functions, connections = parse_xfmv(colored_xfmv, engine=engine)
 
     # Check that Description column exists
     assert 'Description' in functions.columns
@@ -171,3 +201,228 @@ def test_function_description(colored_xfmv: str) -> None:
 
     # Verify the function name is correct
     assert function_0['IDName'].values[0] == "B4"
+
+
+@pytest.mark.parametrize("xfmv_fixture",
+                         ["simple_xfmv", "colored_xfmv", "synthesized_xfmv"])
+def test_streaming_matches_tree(request: pytest.FixtureRequest,
+                                xfmv_fixture: str,
+                                engine: str) -> None:
+    """ Streaming parse produces the same DataFrames as the tree parse. """
+
+    xfmv = request.getfixturevalue(xfmv_fixture)
+
+    functions, connections = parse_xfmv(xfmv, engine='etree')
+    stream_functions, stream_connections = parse_xfmv(xfmv, streaming=True,
+                                                      engine=engine)
+
+    pd.testing.assert_frame_equal(functions, stream_functions)
+    pd.testing.assert_frame_equal(connections, stream_connections)
+
+
+def test_synthesized_connections(synthesized_xfmv: str,
+                                 engine: str) -> None:
+    """ Connections are synthesized from aspects when none are stored. """
+
+    functions, connections = parse_xfmv(synthesized_xfmv, engine=engine)
+
+    expected = {(2, 1, 'C'), (1, 0, 'I'), (1, 3, 'I'), (2, 3, 'T'),
+                (2, 4, 'P'), (0, 1, 'I'), (5, 4, 'R'), (3, 4, 'P')}
+    edges = set(zip(connections.outputFn, connections.toFn,
+                    connections.toAspect))
+
+    assert edges == expected
+    assert np.isfinite(curve_points(connections)).all()
+
+
+def test_connection_dtypes(parsed_xfmv: tuple[pd.DataFrame,
+                                              pd.DataFrame]) -> None:
+    """ IDs use compact integer dtypes and labels are categorical. """
+
+    functions, connections = parsed_xfmv
+
+    assert pd.api.types.is_integer_dtype(functions['IDNr'])
+    assert functions['IDNr'].to_numpy().itemsize == 1
+    assert pd.api.types.is_integer_dtype(connections['outputFn'])
+    assert pd.api.types.is_integer_dtype(connections['toFn'])
+    assert connections['toFn'].to_numpy().itemsize == 1
+
+    for column in ['toAspect', 'directionX', 'directionY']:
+        assert isinstance(connections[column].dtype, pd.CategoricalDtype)
+
+
+def test_missing_connection_functions(simple_xfmv: str,
+                                      tmp_path: Path,
+                                      engine: str) -> None:
+    """ Connections without outputFn/toFn attributes fall back on Name. """
+
+    text = Path(simple_xfmv).read_text()
+    text = re.sub(r' outputFn="\d+" toFn="\d+"', '', text)
+    file = tmp_path / 'no_attributes.xfmv'
+    file.write_text(text)
+
+    functions, connections = parse_xfmv(str(file), engine=engine)
+
+    assert list(connections.outputFn) == [2, 1, 1, 2, 2, 0, 5, 3]
+    assert list(connections.toFn) == [1, 0, 3, 3, 4, 1, 4, 4]
+
+
+@pytest.mark.parametrize("name", ['2|Connection CB|1|X', '2|Connection CB|1'])
+def test_invalid_to_aspect(simple_xfmv: str,
+                           tmp_path: Path,
+                           engine: str,
+                           name: str) -> None:
+    """ A connection Name without a valid aspect is an error. """
+
+    text = Path(simple_xfmv).read_text()
+    text = text.replace('<Name>2|Connection CB|1|C</Name>',
+                        f'<Name>{name}</Name>')
+    file = tmp_path / 'invalid_aspect.xfmv'
+    file.write_text(text)
+
+    with pytest.raises(ValueError, match='Invalid to aspect'):
+        parse_xfmv(str(file), engine=engine)
+
+
+def test_create_bezier_curves() -> None:
+    """ The array Bezier construction matches the scalar construction. """
+
+    from_x = np.array([10.0, 300.0, 55.5, 400.0])
+    from_y = np.array([20.0, 80.0, 300.0, 10.0])
+    to_x = np.array([200.0, 20.0, 55.5, 90.0])
+    to_y = np.array([250.0, 400.0, 20.0, 10.0])
+    to_aspect = np.array(['I', 'T', 'P', 'R'])
+
+    curves = create_bezier_curves(from_x, from_y, np.full(4, 'O'),
+                                  to_x, to_y, to_aspect)
+
+    assert curves.shape == (4, 10)
+
+    expected = [create_bezier_curve(from_x[i], from_y[i], 'O',
+                                    to_x[i], to_y[i], to_aspect[i])
+                for i in range(4)]
+
+    assert format_curves(curves, decimals=2) == expected
+
+    with pytest.raises(ValueError):
+        create_bezier_curves(from_x, from_y, np.full(4, 'O'),
+                             to_x, to_y, np.array(['I', 'T', 'X', 'R']))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_parse_sources(simple_xfmv: str,
+                       streaming: bool,
+                       engine: str) -> None:
+    """ Bytes, buffers, file objects and compressed data parse the same. """
+
+    functions, connections = parse_xfmv(simple_xfmv)
+
+    raw = Path(simple_xfmv).read_bytes()
+    sources: list[XfmvSource] = [raw, bytearray(raw), memoryview(raw),
+                                 io.BytesIO(raw),
+                                 gzip.compress(raw),
+                                 io.BytesIO(gzip.compress(raw))]
+
+    for source in sources:
+        parsed_functions, parsed_connections = parse_xfmv(source,
+                                                          streaming=streaming,
+                                                          engine=engine)
+
+        pd.testing.assert_frame_equal(parsed_functions, functions)
+        pd.testing.assert_frame_equal(parsed_connections, connections)
+
+
+def test_parse_zstd(simple_xfmv: str) -> None:
+    """ zstd compressed data is decompressed while parsing. """
+
+    zstandard = pytest.importorskip('zstandard')
+
+    functions, connections = parse_xfmv(simple_xfmv)
+
+    raw = Path(simple_xfmv).read_bytes()
+    compressed = zstandard.ZstdCompressor().compress(raw)
+
+    parsed_functions, parsed_connections = parse_xfmv(compressed)
+
+    pd.testing.assert_frame_equal(parsed_functions, functions)
+    pd.testing.assert_frame_equal(parsed_connections, connections)
+
+
+def test_open_xfmv_closes(simple_xfmv: str) -> None:
+    """ Decompressors are closed, but the caller's file object is not. """
+
+    compressed = gzip.compress(Path(simple_xfmv).read_bytes())
+    file = io.BytesIO(compressed)
+    sources: list[XfmvSource] = [compressed, file]
+
+    for source in sources:
+        with open_xfmv(source) as stream:
+            assert stream.read(3) == b'<FM'
+        assert stream.closed
+
+    assert not file.closed
+
+
+@pytest.mark.parametrize("xfmv_fixture",
+                         ["simple_xfmv", "colored_xfmv", "synthesized_xfmv"])
+def test_engines_match(request: pytest.FixtureRequest,
+                       xfmv_fixture: str,
+                       engine: str) -> None:
+    """ Every XML engine produces the same DataFrames as the stdlib. """
+
+    xfmv = request.getfixturevalue(xfmv_fixture)
+
+    functions, connections = parse_xfmv(xfmv, engine='etree')
+    engine_functions, engine_connections = parse_xfmv(xfmv, engine=engine)
+
+    pd.testing.assert_frame_equal(functions, engine_functions)
+    pd.testing.assert_frame_equal(connections, engine_connections)
+
+
+def test_invalid_engine(simple_xfmv: str) -> None:
+    """ An unknown XML engine is rejected. """
+
+    with pytest.raises(ValueError):
+        parse_xfmv(simple_xfmv, engine='sax')
+
+
+def test_curve_points(parsed_xfmv: tuple[pd.DataFrame,
+                                         pd.DataFrame]) -> None:
+    """ Curve strings are parsed into a float64 control point array. """
+
+    functions, connections = parsed_xfmv
+
+    curves = curve_points(connections)
+
+    assert curves.shape == (8, 10)
+    assert curves.dtype == np.float64
+
+    row = connections.index[connections.Name == '2|Connection CB|1|C'][0]
+    expected = np.array([185.5, 75.33, 162.83, 215.33, 194.17,
+                         215.33, 205.5, 145.33, 199.83, 180.33])
+
+    np.testing.assert_allclose(curves[row], expected)
+
+
+def test_parse_curves() -> None:
+    """ Curve strings round trip and malformed curves become NaN. """
+
+    curves = ['1.00|2.00|3.00|4.00|5.00|6.00|7.00|8.00|9.00|10.00',
+              None, '', '1|2|3', '1|2|3|4|5|6|7|8|9|x']
+
+    points = parse_curves(curves)
+
+    assert points.shape == (5, 10)
+    assert format_curves(points[:1], decimals=2) == curves[:1]
+    assert np.isnan(points[1:]).all()
+
+
+def test_format_curves_precision() -> None:
+    """ Curve strings keep the full precision of the control points. """
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1000, 1000, (20, 10))
+
+    assert (parse_curves(format_curves(points)) == points).all()
+    assert format_curves(np.arange(10.0)[None, :]) == [
+        '0.0|1.0|2.0|3.0|4.0|5.0|6.0|7.0|8.0|9.0']
@@ -1,6 +1,51 @@
+import gzip
+import io
+import os
 import xml.etree.ElementTree as ET
+from contextlib import ExitStack, contextmanager
+from typing import Any, BinaryIO, Iterator, Sequence, cast
+
+import numpy as np
 import pandas as pd
-import math
+
+# An .xfmv file name, its raw contents, or an open binary file object.
+XfmvSource = str | os.PathLike | bytes | bytearray | memoryview | BinaryIO
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+FUNCTION_FIELDS = ('IDNr', 'FunctionType', 'IDName', 'Description')
+FUNCTION_ATTRIBUTES = ('x', 'y', 'style', 'color', 'fnStyle')
+
+CONNECTION_FIELDS = ('Name', 'Curve')
+CONNECTION_ATTRIBUTES = ('x', 'y', 'directionX', 'directionY', 'notGroup',
+                         'outputFn', 'toFn')
+
+# Connection geometry columns, in the order of the xfmv Curve string. p0 is
+# the output aspect end, p4 the input aspect end, and p1-p3 lie in between.
+CURVE_COLUMNS = ['p0x', 'p0y', 'p4x', 'p4y', 'p3x', 'p3y',
+                 'p1x', 'p1y', 'p2x', 'p2y']
+
+ASPECTS = ['I', 'O', 'T', 'C', 'P', 'R']
+
+ASPECT_TAGS = {
+    'Input': 'I',
+    'Output': 'O',
+    'Control': 'C',
+    'Precondition': 'P',
+    'Time': 'T',
+    'Resource': 'R'
+}
+
+
+ASPECT_OFFSETS = {
+    "I": (-44, 0),
+    "O": (44, 0),
+    "T": (-23, -35),
+    "C": (23, -35),
+    "P": (-23, 35),
+    "R": (23, 35)
+}
 
 
 def create_bezier_curve(from_x: float,
@@ -36,238 +81,660 @@ def create_bezier_curve(from_x: float,
         A string describing the 5 control points of the curve.
     """
 
-    if from_aspect not in ['I', 'O', 'T', 'C', 'P', 'R']:
-        raise ValueError('Invalid to aspect')
-    if to_aspect not in ['I', 'O', 'T', 'C', 'P', 'R']:
-        raise ValueError('Invalid from aspect')
+    curves = create_bezier_curves(np.array([from_x]), np.array([from_y]),
+                                  np.array([from_aspect]),
+                                  np.array([to_x]), np.array([to_y]),
+                                  np.array([to_aspect]),
+                                  curviness=curviness)
 
-    aspect_offsets = {
-        "I": (-44, 0),
-        "O": (44, 0),
-        "T": (-23, -35),
-        "C": (23, -35),
-        "P": (-23, 35),
-        "R": (23, 35)
-    }
+    return format_curves(curves, decimals=2)[0]
 
-    dx0, dy0 = aspect_offsets[from_aspect]
-    dx1, dy1 = aspect_offsets[to_aspect]
 
-    p0x = from_x + 48 + dx0
-    p0y = from_y + 50 + dy0
-    p4x = to_x + 48 + dx1
-    p4y = to_y + 50 + dy1
+def create_bezier_curves(from_x: np.ndarray,
+                         from_y: np.ndarray,
+                         from_aspect: np.ndarray,
+                         to_x: np.ndarray,
+                         to_y: np.ndarray,
+                         to_aspect: np.ndarray,
+                         curviness: float = 0.15) -> np.ndarray:
+    """
+    Create many Bezier curves at once based on a Hobby-spline heuristic.
 
-    if p0x < p4x and p0y < p4y:
-        quadrant = "ll"
-    elif p0x >= p4x and p0y < p4y:
-        quadrant = "lr"
-    elif p0x < p4x and p0y >= p4y:
-        quadrant = "ul"
-    else:
-        quadrant = "ur"
+    This is the array counterpart of create_bezier_curve. All arguments are
+    arrays of the same length, one entry per curve.
+
+    Parameters
+    ----------
+    from_x : np.ndarray
+        x-coordinates of the first control points.
+    from_y : np.ndarray
+        y-coordinates of the first control points.
+    from_aspect : np.ndarray
+        The aspects (I, O, T, C, P, R) of the first control points.
+    to_x : np.ndarray
+        x-coordinates of the last control points.
+    to_y : np.ndarray
+        y-coordinates of the last control points.
+    to_aspect : np.ndarray
+        The aspects (I, O, T, C, P, R) of the last control points.
+    curviness : float, optional
+        0 is straight. 0.5 is round. Defaults to 0.15 for a slight curve.
 
-    flip = False
-    if to_aspect in ['T', 'C'] and quadrant in ["ll", "lr"]:
-        flip = True
-    elif to_aspect in ['P', 'R'] and quadrant in ["ul", "ur"]:
-        flip = True
-    elif to_aspect == 'I' and quadrant in ["ll", "lr"]:
-        flip = True
+    Returns
+    -------
+    np.ndarray
+        A (number of curves, 10) array of the 5 control points of each curve,
+        in the same order as the xfmv Curve string.
+    """
 
-    s_curve = False
-    if to_aspect == 'I':
-        s_curve = True
+    from_aspect = np.asarray(from_aspect, dtype=str)
+    to_aspect = np.asarray(to_aspect, dtype=str)
+
+    if not np.isin(from_aspect, ASPECTS).all():
+        raise ValueError('Invalid from aspect')
+    if not np.isin(to_aspect, ASPECTS).all():
+        raise ValueError('Invalid to aspect')
+
+    # Offsets ordered alphabetically by aspect, for lookup by searchsorted
+    order = sorted(ASPECT_OFFSETS)
+    offsets = np.array([ASPECT_OFFSETS[aspect] for aspect in order],
+                       dtype=np.float64)
+    from_offsets = offsets[np.searchsorted(order, from_aspect)]
+    to_offsets = offsets[np.searchsorted(order, to_aspect)]
+
+    p0x = np.asarray(from_x, dtype=np.float64) + 48 + from_offsets[:, 0]
+    p0y = np.asarray(from_y, dtype=np.float64) + 50 + from_offsets[:, 1]
+    p4x = np.asarray(to_x, dtype=np.float64) + 48 + to_offsets[:, 0]
+    p4y = np.asarray(to_y, dtype=np.float64) + 50 + to_offsets[:, 1]
+
+    # The lower quadrants ("ll", "lr") are those where p0 is above p4.
+    lower = p0y < p4y
+    flip = ((np.isin(to_aspect, ['T', 'C']) & lower)
+            | (np.isin(to_aspect, ['P', 'R']) & ~lower)
+            | ((to_aspect == 'I') & lower))
+
+    s_curve = to_aspect == 'I'
 
     dx = p4x - p0x
     dy = p4y - p0y
-    L = math.sqrt(dx**2 + dy**2)
-    if L == 0:
+    L = np.sqrt(dx**2 + dy**2)
+    if (L == 0).any():
         raise ValueError("Endpoints are identical")
 
     # 90 degree left normal
-    nx = -dy / L
-    ny = dx / L
-    if flip:
-        nx = -nx
-        ny = -ny
+    nx = np.where(flip, dy / L, -dy / L)
+    ny = np.where(flip, -dx / L, dx / L)
 
     # handle distance along the chord and normal offset
     k = curviness * L
 
     # build middle three control points
-    if s_curve:
-        p1x = p0x + dx * 0.33 + nx * k
-        p1y = p0y + dy * 0.33 + ny * k
-        p2x = p0x + dx * 0.5
-        p2y = p0y + dy * 0.5
-        p3x = p0x + dx * 0.66 - nx * k
-        p3y = p0y + dy * 0.66 - ny * k
+    curves = np.empty((len(p0x), 10), dtype=np.float64)
+    curves[:, 0] = p0x
+    curves[:, 1] = p0y
+    curves[:, 2] = p4x
+    curves[:, 3] = p4y
+    curves[:, 4] = np.where(s_curve,
+                            p0x + dx * 0.66 - nx * k,
+                            p0x + dx * 0.66 + nx * k)
+    curves[:, 5] = np.where(s_curve,
+                            p0y + dy * 0.66 - ny * k,
+                            p0y + dy * 0.66 + ny * k)
+    curves[:, 6] = p0x + dx * 0.33 + nx * k
+    curves[:, 7] = p0y + dy * 0.33 + ny * k
+    curves[:, 8] = np.where(s_curve,
+                            p0x + dx * 0.5,
+                            p0x + dx * 0.5 + nx * k)
+    curves[:, 9] = np.where(s_curve,
+                            p0y + dy * 0.5,
+                            p0y + dy * 0.5 + ny * k)
+
+    return curves
+
+
+def format_curves(curves: np.ndarray,
+                  decimals: int | None = None) -> list[str]:
+    """
+    Format Bezier control points as xfmv Curve strings.
+
+    Parameters
+    ----------
+    curves : np.ndarray
+        A (number of curves, 10) array of control points.
+    decimals : int, optional
+        The number of decimal places of each control point. If None, each
+        is written with as many digits as needed to parse back to the same
+        value. Defaults to None.
+
+    Returns
+    -------
+    list[str]
+        The pipe-delimited Curve string of each curve.
+    """
+
+    if decimals is None:
+        return ["|".join(map(repr, curve)) for curve in curves.tolist()]
+
+    template = "|".join([f"%.{decimals}f"] * 10)
+    return [template % tuple(curve) for curve in curves.tolist()]
+
+
+def parse_curves(curves: Sequence[str | None]) -> np.ndarray:
+    """
+    Parse xfmv Curve strings into Bezier control points.
+
+    Parameters
+    ----------
+    curves : Sequence[str | None]
+        The pipe-delimited Curve string of each connection.
+
+    Returns
+    -------
+    np.ndarray
+        A (number of curves, 10) array of control points. Rows of missing or
+        malformed curves, including curves with a field that is not a
+        number, are NaN.
+    """
+
+    points = np.full((len(curves), len(CURVE_COLUMNS)), np.nan)
+
+    rows = []
+    valid = []
+    for i, curve in enumerate(curves):
+        if curve and curve.count('|') == len(CURVE_COLUMNS) - 1:
+            rows.append(i)
+            valid.append(curve)
+
+    # Split all curves at once rather than one at a time
+    if valid:
+        fields = '|'.join(valid).split('|')
+        try:
+            values = np.array(fields, dtype=np.float64)
+        except ValueError:
+            values = pd.to_numeric(pd.Series(fields), errors='coerce'
+                                   ).to_numpy(dtype=np.float64)
+        points[rows] = values.reshape(len(valid), len(CURVE_COLUMNS))
+        points[np.isnan(points).any(axis=1)] = np.nan
+
+    return points
+
+
+def curve_points(df_connection: pd.DataFrame) -> np.ndarray:
+    """
+    Return the Bezier control points of each connection.
+
+    Parameters
+    ----------
+    df_connection : pd.DataFrame
+        A DataFrame containing the connection data.
+
+    Returns
+    -------
+    np.ndarray
+        A (number of connections, 10) float64 array of control points, in
+        the order of the xfmv Curve string.
+    """
+
+    return df_connection[CURVE_COLUMNS].to_numpy(dtype=np.float64)
+
+
+def _new_columns(columns: tuple[str, ...]) -> dict[str, list]:
+    """ Create an empty list for each of the given columns. """
+
+    return {column: [] for column in columns}
+
+
+def _append_record(columns: dict[str, list],
+                   elem: ET.Element,
+                   fields: tuple[str, ...],
+                   attributes: tuple[str, ...]) -> None:
+    """ Append the child text fields and attributes of an element. """
+
+    for field in fields:
+        columns[field].append(elem.findtext(field))
+    for attribute in attributes:
+        columns[attribute].append(elem.attrib.get(attribute, None))
+
+
+def _aspect_ref(aspect_elem: ET.Element) -> tuple[str, int] | None:
+    """ Extract the (IDName, function ID) referenced by an aspect element. """
+
+    idname = aspect_elem.findtext("IDName")
+    fn_id = aspect_elem.findtext("FunctionIDNr")
+    if idname and fn_id:
+        return idname, int(fn_id)
+    return None
+
+
+def _group_aspect_refs(refs_by_tag: dict[str, list[tuple[str, int]]]
+                       ) -> dict[str, list[tuple[int, str]]]:
+    """
+    Group aspect references by aspect name.
+
+    Tags are visited in the order of ASPECT_TAGS so that the grouping does
+    not depend on the order of the sections within the file.
+    """
+
+    # dict of (IDName, [[fn_id, aspect], ...])
+    aspect_refs: dict[str, list[tuple[int, str]]] = dict()
+    for tag, char in ASPECT_TAGS.items():
+        for idname, fn_id in refs_by_tag.get(tag, []):
+            aspect_refs.setdefault(idname, []).append((fn_id, char))
+
+    return aspect_refs
+
+
+class _PrefixedReader(io.RawIOBase):
+    """ A binary stream that replays already consumed bytes first. """
+
+    def __init__(self, prefix: bytes, stream: BinaryIO):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _decompress(stream: BinaryIO) -> BinaryIO:
+    """ Wrap a binary stream in a decompressor if it is gzip or zstd. """
+
+    if stream.seekable():
+        start = stream.tell()
+        magic = stream.read(4)
+        stream.seek(start)
     else:
-        p1x = p0x + dx * 0.33 + nx * k
-        p1y = p0y + dy * 0.33 + ny * k
-        p2x = p0x + dx * 0.5 + nx * k
-        p2y = p0y + dy * 0.5 + ny * k
-        p3x = p0x + dx * 0.66 + nx * k
-        p3y = p0y + dy * 0.66 + ny * k
+        magic = stream.read(4)
+        stream = io.BufferedReader(_PrefixedReader(magic, stream))
+
+    if magic.startswith(GZIP_MAGIC):
+        return cast(BinaryIO, gzip.GzipFile(fileobj=stream, mode='rb'))
 
-    curve = f"{p0x:.2f}|{p0y:.2f}|{p4x:.2f}|{p4y:.2f}|"
-    curve += f"{p3x:.2f}|{p3y:.2f}|{p1x:.2f}|{p1y:.2f}|{p2x:.2f}|{p2y:.2f}"
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading zstd-compressed .xfmv files requires "
+                              "the zstandard package.")
+        return zstandard.ZstdDecompressor().stream_reader(stream,
+                                                          closefd=False)
 
-    return curve
+    return stream
 
 
-def synthesize_connections(root: ET.Element,
-                           df_function: pd.DataFrame) -> list:
+@contextmanager
+def open_xfmv(source: XfmvSource) -> Iterator[BinaryIO]:
     """
-    Create connections based on Aspects data in an xfmv file.
+    Open an .xfmv source as a binary stream of uncompressed XML.
+
+    Gzip and zstd compressed sources are detected from their contents and
+    decompressed on the fly as the stream is read.
 
     Parameters
     ----------
-    root : ET.Element
-        The xml element tree root.
-    df_function : pd.DataFrame
-        A DataFrame containing the function data.
+    source : str | os.PathLike | bytes | bytearray | memoryview | BinaryIO
+        A .xfmv file name, the raw file contents, or an open binary file.
+
+    Yields
+    ------
+    BinaryIO
+        A binary stream of the XML document.
+    """
+
+    with ExitStack() as stack:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            stream: BinaryIO = io.BytesIO(source)
+        elif isinstance(source, (str, os.PathLike)):
+            stream = stack.enter_context(open(source, 'rb'))
+        elif hasattr(source, 'read'):
+            stream = source
+        else:
+            raise TypeError("An .xfmv file name, bytes or a binary file "
+                            "object is required.")
+
+        # Close the decompressor before the stream it reads from. A file
+        # object given by the caller is left open.
+        decompressed = _decompress(stream)
+        if decompressed is not stream:
+            stack.callback(decompressed.close)
+
+        yield decompressed
+
+
+def available_engines() -> list[str]:
+    """
+    Return the XML engines that can be used to parse .xfmv files.
 
     Returns
     -------
-    list
-        A list containing the synthesized connections.
+    list[str]
+        The names of the installed engines, fastest first.
+    """
+
+    engines = []
+    try:
+        import lxml.etree  # noqa: F401
+        engines.append('lxml')
+    except ImportError:
+        pass
+    engines.append('etree')
+
+    return engines
+
+
+def _xml_engine(engine: str | None) -> Any:
+    """
+    Return the ElementTree-compatible module of an XML engine.
+
+    Parameters
+    ----------
+    engine : {'lxml', 'etree'}, optional
+        The XML engine. If None, the fastest available engine is used.
+
+    Returns
+    -------
+    module
+        A module providing ElementTree's parse and iterparse functions.
     """
-    aspect_tags = {
-        'Input': 'I',
-        'Output': 'O',
-        'Control': 'C',
-        'Precondition': 'P',
-        'Time': 'T',
-        'Resource': 'R'
-    }
 
-    # Parse dict of (IDName, [[fn_id, aspect], ...])
-    connections: dict[str, list[tuple[int, str]]] = dict()
+    if engine is None:
+        engine = available_engines()[0]
 
-    for tag, char in aspect_tags.items():
+    engine = engine.lower()
+    if engine == 'etree':
+        return ET
+    if engine == 'lxml':
+        try:
+            import lxml.etree
+        except ImportError:
+            raise ImportError("The lxml engine requires the lxml package.")
+        return lxml.etree
+
+    raise ValueError("Invalid XML engine. Use 'lxml' or 'etree'.")
+
+
+def _read_tree(source: BinaryIO,
+               xml: Any) -> tuple[dict, dict, dict]:
+    """
+    Read the function, connection and aspect records of an xfmv file by
+    building the full element tree.
+    """
+    tree = xml.parse(source)
+    root = tree.getroot()
+
+    function_data = _new_columns(FUNCTION_FIELDS + FUNCTION_ATTRIBUTES)
+    for elem in root.findall('.//Function'):
+        _append_record(function_data, elem,
+                       FUNCTION_FIELDS, FUNCTION_ATTRIBUTES)
+
+    connection_data = _new_columns(CONNECTION_ATTRIBUTES + CONNECTION_FIELDS)
+    for elem in root.findall('.//Aspect'):
+        _append_record(connection_data, elem,
+                       CONNECTION_FIELDS, CONNECTION_ATTRIBUTES)
+
+    refs_by_tag: dict[str, list[tuple[str, int]]] = dict()
+    for tag in ASPECT_TAGS:
         for elem in root.findall(f".//{tag}"):
-            idname = elem.findtext("IDName")
-            fn_id = elem.findtext("FunctionIDNr")
-            if idname and fn_id:
-                connections.setdefault(idname, []).append((int(fn_id), char))
+            ref = _aspect_ref(elem)
+            if ref is not None:
+                refs_by_tag.setdefault(tag, []).append(ref)
+
+    return function_data, connection_data, _group_aspect_refs(refs_by_tag)
+
+
+def _read_stream(source: BinaryIO,
+                 xml: Any,
+                 functions_only: bool = False) -> tuple[dict, dict, dict]:
+    """
+    Read the function, connection and aspect records of an xfmv file in a
+    single streaming pass.
+
+    Elements are discarded as soon as their record has been extracted, so
+    memory use is bounded by the size of the extracted records rather than
+    the size of the element tree. If functions_only is True, reading stops
+    at the end of the Functions element.
+    """
+    function_data = _new_columns(FUNCTION_FIELDS + FUNCTION_ATTRIBUTES)
+    connection_data = _new_columns(CONNECTION_ATTRIBUTES + CONNECTION_FIELDS)
+    refs_by_tag: dict[str, list[tuple[str, int]]] = dict()
+
+    # Stack of currently open elements, used to detach finished records
+    # from their parent.
+    open_elems: list[ET.Element] = []
+
+    for event, elem in xml.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            open_elems.append(elem)
+            continue
+
+        open_elems.pop()
+        tag = elem.tag
+
+        if tag == 'Functions' and functions_only:
+            break
+        elif tag == 'Function':
+            _append_record(function_data, elem,
+                           FUNCTION_FIELDS, FUNCTION_ATTRIBUTES)
+        elif tag == 'Aspect':
+            _append_record(connection_data, elem,
+                           CONNECTION_FIELDS, CONNECTION_ATTRIBUTES)
+        elif tag in ASPECT_TAGS:
+            ref = _aspect_ref(elem)
+            if ref is not None:
+                refs_by_tag.setdefault(tag, []).append(ref)
+        else:
+            continue
+
+        elem.clear()
+        if open_elems:
+            open_elems[-1].remove(elem)
+
+    return function_data, connection_data, _group_aspect_refs(refs_by_tag)
+
+
+def _to_compact_int(values: list | pd.Series) -> np.ndarray:
+    """ Convert integer IDs to the smallest integer dtype that holds them. """
 
-    synthesized_connections = []
-    for idname, refs in connections.items():
+    ids = np.asarray(values).astype(np.int64)
+    return pd.to_numeric(ids, downcast='integer')
+
+
+def _function_table(function_data: dict[str, list]) -> pd.DataFrame:
+    """ Build the function DataFrame from its column lists. """
+
+    df_function = pd.DataFrame(function_data)
+    df_function['IDNr'] = _to_compact_int(function_data['IDNr'])
+    df_function['FunctionType'] = _to_compact_int(
+        function_data['FunctionType'])
+    df_function['x'] = np.asarray(function_data['x'], dtype=np.float64)
+    df_function['y'] = np.asarray(function_data['y'], dtype=np.float64)
+
+    return df_function
+
+
+def synthesize_connections(aspect_refs: dict[str, list[tuple[int, str]]],
+                           df_function: pd.DataFrame
+                           ) -> tuple[dict[str, list], np.ndarray]:
+    """
+    Create connections based on Aspects data in an xfmv file.
+
+    Parameters
+    ----------
+    aspect_refs : dict
+        The aspects referenced by each function, keyed by aspect name. Each
+        value is a list of (function ID, aspect) tuples.
+    df_function : pd.DataFrame
+        A DataFrame containing the function data.
+
+    Returns
+    -------
+    dict
+        The columns of the synthesized connections, except for the curves.
+    np.ndarray
+        A (number of connections, 10) array of the control points of the
+        curve of each synthesized connection.
+    """
+
+    output_fns = []
+    target_fns = []
+    to_aspects = []
+    names = []
+    for idname, refs in aspect_refs.items():
         outputs = [(fid, aspect) for fid, aspect in refs if aspect == 'O']
         targets = [(fid, aspect) for fid, aspect in refs if aspect != 'O']
 
         for output_fn, _ in outputs:
             for target_fn, to_aspect in targets:
-                synthesized_connections.append({
-                    "x": "0.000",
-                    "y": "0.000",
-                    "directionX": "from",
-                    "directionY": "to",
-                    "notGroup": "true",
-                    "outputFn": output_fn,
-                    "toFn": target_fn,
-                    "Name": f"{output_fn}|{idname}|{target_fn}|{to_aspect}",
-                    "Curve": "",
-                })
-
-    # make curves
-    for aspect in synthesized_connections:
-        from_fn = aspect['outputFn']
-        to_fn = aspect['toFn']
-        from_aspect = "O"  # always from output
-        to_aspect = str(aspect['Name']).split("|")[3]  # target always at end
-
-        x0 = df_function[df_function.IDNr == from_fn]['x'].iloc[0]
-        y0 = df_function[df_function.IDNr == from_fn]['y'].iloc[0]
-        x1 = df_function[df_function.IDNr == to_fn]['x'].iloc[0]
-        y1 = df_function[df_function.IDNr == to_fn]['y'].iloc[0]
-
-        aspect['Curve'] = create_bezier_curve(x0, y0, from_aspect,
-                                              x1, y1, to_aspect)
-
-    return synthesized_connections
-
-
-def parse_xfmv(filename: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+                output_fns.append(output_fn)
+                target_fns.append(target_fn)
+                to_aspects.append(to_aspect)
+                names.append(f"{output_fn}|{idname}|{target_fn}|{to_aspect}")
+
+    # Index function positions by ID once, rather than per connection
+    function_ids = pd.Index(df_function['IDNr'])
+    from_pos = function_ids.get_indexer(output_fns)
+    to_pos = function_ids.get_indexer(target_fns)
+    if (from_pos < 0).any() or (to_pos < 0).any():
+        raise ValueError("Aspect refers to an unknown function ID.")
+
+    x = df_function['x'].to_numpy(dtype=np.float64)
+    y = df_function['y'].to_numpy(dtype=np.float64)
+
+    # make curves, always from the output aspect
+    curves = create_bezier_curves(x[from_pos], y[from_pos],
+                                  np.full(len(names), 'O'),
+                                  x[to_pos], y[to_pos],
+                                  np.array(to_aspects, dtype=str))
+
+    n = len(names)
+    columns: dict[str, list] = {
+        "x": ["0.000"] * n,
+        "y": ["0.000"] * n,
+        "directionX": ["from"] * n,
+        "directionY": ["to"] * n,
+        "notGroup": ["true"] * n,
+        "outputFn": output_fns,
+        "toFn": target_fns,
+        "Name": names,
+    }
+
+    return columns, curves
+
+
+def parse_xfmv(filename: XfmvSource,
+               streaming: bool = False,
+               engine: str | None = None
+               ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Parse an xfmv file into its function and connection data.
 
     Parameters
     ----------
-    filename : str
-        A .xfmv file to parse.
+    filename : str | os.PathLike | bytes | bytearray | memoryview | BinaryIO
+        A .xfmv file to parse. This may be a file name, the raw contents of
+        the file, or a binary file object. Gzip and zstd compressed files
+        are decompressed on the fly.
+    streaming : bool, optional
+        If True, read the file in a single streaming pass, discarding XML
+        elements as they are consumed. This keeps memory bounded for very
+        large models. The resulting DataFrames are identical to those of the
+        default mode. Defaults to False.
+    engine : {'lxml', 'etree'}, optional
+        The XML engine used to read the file. 'lxml' is a faster C parser
+        that requires the lxml package. 'etree' is the Python standard
+        library's xml.etree.ElementTree. The resulting DataFrames do not
+        depend on the engine. Defaults to None, for the fastest available.
 
     Returns
     -------
     pd.DataFrame
         A dataframe containing the function data.
     pd.DataFrame
-        A dataframe containing the connection data.
+        A dataframe containing the connection data. The control points of
+        the Bezier curve of each connection are stored as float64 columns,
+        listed in CURVE_COLUMNS.
     """
-    # Parse the XML file
-    tree = ET.parse(filename)
-    root = tree.getroot()
+    xml = _xml_engine(engine)
 
-    # Extract data from Function elements
-    function_data = []
-
-    for function_elem in root.findall('.//Function'):
-        element_data = {
-            'IDNr': function_elem.findtext('IDNr'),
-            'FunctionType': function_elem.findtext('FunctionType'),
-            'IDName': function_elem.findtext('IDName'),
-            'Description': function_elem.findtext('Description'),
-            'x': function_elem.attrib.get('x', None),
-            'y': function_elem.attrib.get('y', None),
-            'style': function_elem.attrib.get('style', None),
-            'color': function_elem.attrib.get('color', None),
-            'fnStyle': function_elem.attrib.get('fnStyle', None)
-        }
-        function_data.append(element_data)
+    with open_xfmv(filename) as source:
+        if streaming:
+            records = _read_stream(source, xml)
+        else:
+            records = _read_tree(source, xml)
+    function_data, connection_data, aspect_refs = records
 
-    df_function = pd.DataFrame(function_data)
-    df_function['IDNr'] = df_function['IDNr'].astype(int)
-    df_function['FunctionType'] = df_function['FunctionType'].astype(int)
-    df_function['x'] = df_function['x'].astype(float)
-    df_function['y'] = df_function['y'].astype(float)
-
-    # Extract data from Aspect elements
-    connection_data = []
-
-    for connection_elem in root.findall('.//Aspect'):
-        connection_element_data = {
-            'x': connection_elem.attrib.get('x', None),
-            'y': connection_elem.attrib.get('y', None),
-            'directionX': connection_elem.attrib.get('directionX', None),
-            'directionY': connection_elem.attrib.get('directionY', None),
-            'notGroup': connection_elem.attrib.get('notGroup', None),
-            'outputFn': connection_elem.attrib.get('outputFn', None),
-            'toFn': connection_elem.attrib.get('toFn', None),
-            'Name': connection_elem.findtext('Name'),
-            'Curve': connection_elem.findtext('Curve'),
-        }
-        connection_data.append(connection_element_data)
-
-    if len(connection_data) == 0:
-        connection_data = synthesize_connections(root, df_function)
+    df_function = _function_table(function_data)
 
-    df_connection = pd.DataFrame(connection_data)
+    if len(connection_data['Name']) == 0:
+        connection_data, curves = synthesize_connections(aspect_refs,
+                                                         df_function)
+    else:
+        curves = parse_curves(connection_data.pop('Curve'))
+
+    # 0 = OutputFn, 1 = Name, 2 = toFn, 3 = Aspect (R,C,I,O,T,P)
+    names = pd.Series(connection_data['Name'], dtype=str)
+    name_split = names.str.split('|', expand=True).reindex(columns=range(4))
 
-    for index, row in df_connection.iterrows():
-        # 0 = OutputFn, 1 = Name, 2 = toFn, 3 = Aspect (R,C,I,O,T,P)
-        name_split = row.Name.split("|")
-        if row['outputFn'] is None:
-            row['outputFn'] = name_split[0]
-        if row['toFn'] is None:
-            row['toFn'] = name_split[2]
+    # Fall back on the Name for connections without outputFn/toFn attributes
+    output_fn = pd.Series(connection_data['outputFn'], dtype=object)
+    to_fn = pd.Series(connection_data['toFn'], dtype=object)
 
-    df_connection['outputFn'] = df_connection['outputFn'].astype(int)
-    df_connection['toFn'] = df_connection['toFn'].astype(int)
+    df_connection = pd.DataFrame(connection_data)
+    df_connection['directionX'] = pd.Categorical(
+        connection_data['directionX'])
+    df_connection['directionY'] = pd.Categorical(
+        connection_data['directionY'])
+    df_connection['outputFn'] = _to_compact_int(
+        output_fn.fillna(name_split[0]))
+    df_connection['toFn'] = _to_compact_int(to_fn.fillna(name_split[2]))
+    df_connection['parsed_name'] = name_split[1]
+    to_aspect = name_split[3]
+    if not to_aspect.isin(ASPECTS).all():
+        raise ValueError('Invalid to aspect')
+    df_connection['toAspect'] = pd.Categorical(to_aspect, categories=ASPECTS)
 
-    df_tmp = df_connection['Name'].str.split('|', expand=True)
-    df_connection['parsed_name'] = df_tmp[1]
-    df_connection['toAspect'] = df_tmp[3]
+    # Keep the curve geometry as a single float64 block
+    df_curves = pd.DataFrame(curves, columns=CURVE_COLUMNS)
+    df_connection = pd.concat([df_connection, df_curves], axis=1)
 
     return df_function, df_connection
+
+
+def parse_xfmv_functions(filename: XfmvSource,
+                         engine: str | None = None) -> pd.DataFrame:
+    """
+    Parse only the function data of an xfmv file.
+
+    The file is streamed and reading stops as soon as all functions have
+    been read, so the connections are never parsed.
+
+    Parameters
+    ----------
+    filename : str | os.PathLike | bytes | bytearray | memoryview | BinaryIO
+        A .xfmv file to parse.
+    engine : {'lxml', 'etree'}, optional
+        The XML engine used to read the file. Defaults to None, for the
+        fastest available.
+
+    Returns
+    -------
+    pd.DataFrame
+        A dataframe containing the function data, identical to the one
+        returned by parse_xfmv.
+    """
+    xml = _xml_engine(engine)
+
+    with open_xfmv(filename) as source:
+        function_data, _, _ = _read_stream(source, xml, functions_only=True)
+
+    return _function_table(function_data)